@@ -1,83 +1,265 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import atexit
 import os
 import sys
-import google.generativeai as genai
+import threading
 from datetime import datetime
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import base64
+import hashlib
+import hmac
+import shutil
 import tempfile
 import time
-import requests
+import random
+from bisect import bisect_right
+from itertools import accumulate
 
 # Add the current directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
-# Update the import to use the simplified document processor
-from utils.simple_document_processor import SimpleDocumentProcessor
+@st.cache_resource
+def get_doc_processor():
+    """Return the SimpleDocumentProcessor shared by all sessions, so the database and embedding model load once per process"""
+    # Imported on first use so the page renders without loading the embedding/database stack
+    from utils.simple_document_processor import SimpleDocumentProcessor
+    processor = SimpleDocumentProcessor()
+    # Checkpoint SQLite and close pooled connections when the server shuts down
+    atexit.register(processor.db.close)
+    return processor
+
+def extract_keywords(message):
+    """Split a message into search keywords; small talk yields none"""
+    if is_small_talk(message):
+        return []
+    return [word.strip() for word in message.split() if len(word.strip()) > 1]
+
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def retrieve_context(query):
+    """Return the unique document chunks relevant to a query, cached by the exact query text"""
+    keywords = extract_keywords(query)
+    if not keywords:
+        return []
+    # Search for all keywords in a single lookup: one embedding and one database query
+    chunks = get_doc_processor().query_similar(query, n_results=MAX_CONTEXT_CHUNKS, keywords=keywords)
+    # Remove duplicates while preserving order
+    return list(dict.fromkeys(chunks))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_uploaded_files_cached():
+    """Return the names of the indexed files, cached so reruns don't refetch every chunk"""
+    return get_doc_processor().get_uploaded_files()
+
+def with_script_context(func):
+    """Wrap a function so it can call Streamlit from a worker thread"""
+    ctx = get_script_run_ctx()
+
+    def wrapper(*args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+def clear_query_caches():
+    """Drop cached retrieval results and the file list after documents are added or removed"""
+    # The processor clears its own similarity cache when documents change
+    retrieve_context.clear()
+    get_uploaded_files_cached.clear()
 
 def check_api_key():
     if "GEMINI_API_KEY" not in st.secrets:
         st.error("Please set the GEMINI_API_KEY in your Streamlit secrets.")
         st.stop()
-    genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
 
+@st.cache_resource
 def init_gemini_model():
+    """Create the Gemini model once and reuse it (and its connection) across turns"""
+    # Imported on first use so visitors who never chat don't pay for loading the SDK
+    import google.generativeai as genai
+
+    # gRPC runs over a single multiplexed HTTP/2 channel that is reused across requests
+    genai.configure(api_key=st.secrets["GEMINI_API_KEY"], transport="grpc")
     return genai.GenerativeModel("gemini-2.0-flash")
 
-def handle_rate_limit_error(e):
-    """Handle rate limit errors from Gemini API"""
-    # Gemini API uses different rate limiting mechanism
-    # This is a simplified handler for demonstration
-    retry_after = 5  # Default retry after 5 seconds
+# Retry policy for rate-limited Gemini requests
+MAX_RETRIES = 3
+MAX_RETRY_DELAY = 30  # seconds
 
-    if hasattr(e, 'status_code') and e.status_code == 429:
-        st.warning(f"Rate limit reached. Please wait {retry_after} seconds before trying again.")
-        time.sleep(retry_after)
-        return True
+# Requests per minute sent to Gemini across all sessions (the free-tier limit by default);
+# set GEMINI_RPM to 0 to turn throttling off
+DEFAULT_GEMINI_RPM = 15
 
-    return False
+@st.cache_resource
+def get_rate_limiter():
+    """Return the token bucket shared by all sessions, so requests are paced before they hit a 429.
 
-def get_assistant_response(messages):
-    model = init_gemini_model()
+    Returns None when throttling is turned off.
+    """
+    from utils.rate_limiter import TokenBucket
     try:
-        user_message = messages[-1]["content"]
-        status_placeholder = st.empty()
-
-        with status_placeholder:
-            with st.status("✨ Processing your request...") as status:
-                # Extract keywords from user message
-                keywords = [word.strip() for word in user_message.split() if len(word.strip()) > 1]
-                status.write(f"Keywords extracted: {', '.join(keywords)}")
-
-                # Search for content using the keywords - don't show notifications for regular users
-                doc_processor = SimpleDocumentProcessor(show_notifications=False)
-                all_chunks = []
-
-                for keyword in keywords:
-                    chunks = doc_processor.query_similar(keyword)
-                    if chunks:
-                        all_chunks.extend(chunks)
-
-                if all_chunks:
-                    status.write("Found relevant content...")
-                    # Remove duplicates while preserving order
-                    seen = set()
-                    unique_chunks = []
-                    for chunk in all_chunks:
-                        if chunk not in seen:
-                            unique_chunks.append(chunk)
-                            seen.add(chunk)
-
-                    # Combine chunks (limit to 10 most relevant)
-                    combined_chunks = "\n\n".join(unique_chunks[:10])
-
-                    # Create system message with context
-                    system_prompt = f"""You are a helpful assistant that answers questions based on the provided context.
-Use the information from the context below to answer the user's question: "{user_message}"
-
-Context:
-{combined_chunks}
+        rpm = float(st.secrets.get("GEMINI_RPM", DEFAULT_GEMINI_RPM))
+    except (TypeError, ValueError):
+        st.warning(f"Invalid GEMINI_RPM, using {DEFAULT_GEMINI_RPM} requests per minute")
+        rpm = DEFAULT_GEMINI_RPM
+    return TokenBucket(rpm) if rpm > 0 else None
+
+def is_rate_limit_error(e):
+    """Check whether an exception from the Gemini API is a rate limit (HTTP 429)"""
+    return getattr(e, 'code', None) == 429 or getattr(e, 'status_code', None) == 429 or "429" in str(e)
+
+def get_retry_delay(e, attempt):
+    """Return how long to wait before the next attempt, honouring Retry-After when present"""
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_RETRY_DELAY)
+        except ValueError:
+            pass
+
+    # Exponential backoff with jitter so concurrent sessions don't retry in lockstep
+    return min(2 ** attempt, MAX_RETRY_DELAY) + random.uniform(0, 1)
+
+def handle_rate_limit_error(e, attempt):
+    """Wait before retrying a rate-limited Gemini request.
+
+    Returns True if the request should be retried, False once retries are exhausted.
+    """
+    if attempt >= MAX_RETRIES:
+        return False
 
+    retry_after = get_retry_delay(e, attempt)
+    st.warning(f"Rate limit reached. Retrying in {retry_after:.0f} seconds...")
+    time.sleep(retry_after)
+    return True
+
+def estimate_tokens(text):
+    """Estimate the Gemini token count of text without a tokenizer round trip"""
+    # Latin text averages about 4 characters per token; Thai and other
+    # non-ASCII scripts are much denser, at roughly 2 characters per token
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 2 + 1
+
+# Limits on the document context sent with each question
+MAX_CONTEXT_CHUNKS = 10
+MAX_CONTEXT_TOKENS = 2000
+
+def build_context(chunks):
+    """Join the most relevant chunks, stopping before the context token budget is exceeded"""
+    chunks = chunks[:MAX_CONTEXT_CHUNKS]
+    # Running token totals are non-decreasing, so the cutoff is a binary search
+    cumulative_tokens = list(accumulate(estimate_tokens(chunk) for chunk in chunks))
+    return "\n\n".join(chunks[:bisect_right(cumulative_tokens, MAX_CONTEXT_TOKENS)])
+
+# Limit on the conversation history sent with each question
+MAX_HISTORY_TOKENS = 1500
+
+def trim_history(messages):
+    """Keep the most recent messages that fit in the history token budget, always including the latest one"""
+    trimmed = []
+    used = 0
+    for msg in reversed(messages):
+        used += estimate_tokens(msg["content"])
+        if trimmed and used > MAX_HISTORY_TOKENS:
+            break
+        trimmed.append(msg)
+    return trimmed[::-1]
+
+def to_gemini_messages(messages):
+    """Convert chat messages to Gemini's role/parts format"""
+    return [
+        {"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]}
+        for msg in messages
+    ]
+
+def stream_response_text(response):
+    """Yield the text of each chunk from a streaming Gemini response"""
+    for chunk in response:
+        # Skip chunks without content (e.g. the final chunk carrying only metadata)
+        if chunk.parts:
+            yield chunk.text
+
+# Exact-match cache of generated answers, keyed by the full prompt sent to Gemini
+GENERATION_CACHE_SIZE = 512
+GENERATION_CACHE_TTL = 3600  # seconds
+
+@st.cache_resource
+def get_generation_cache():
+    """Return the process-wide generation cache and the lock guarding it"""
+    return OrderedDict(), threading.Lock()
+
+def generation_cache_key(gemini_messages):
+    """Hash the prompt (context, history and question) that determines an answer"""
+    digest = hashlib.sha256()
+    for msg in gemini_messages:
+        digest.update(msg["role"].encode())
+        digest.update(b"\0")
+        digest.update(msg["parts"][0].encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def lookup_generation(key):
+    """Return a fresh cached answer for a prompt key, or None"""
+    cache, lock = get_generation_cache()
+    with lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        created_at, text = entry
+        if time.time() - created_at > GENERATION_CACHE_TTL:
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return text
+
+def store_generation(key, text):
+    """Remember the answer generated for a prompt key"""
+    cache, lock = get_generation_cache()
+    with lock:
+        cache[key] = (time.time(), text)
+        cache.move_to_end(key)
+        if len(cache) > GENERATION_CACHE_SIZE:
+            cache.popitem(last=False)
+
+def stream_and_cache(stream, question=None, prompt_key=None):
+    """Pass a response stream through and cache the full answer once it completes.
+
+    The answer is cached by question similarity only when a question is given, i.e. on
+    the first turn of a conversation, where the answer doesn't depend on earlier messages.
+    """
+    parts = []
+    for text in stream:
+        parts.append(text)
+        yield text
+    answer = "".join(parts)
+    # Nothing generated (e.g. a blocked response): don't serve the empty answer again
+    if not answer:
+        return
+    if question is not None:
+        get_doc_processor().cache_response(question, answer)
+    if prompt_key is not None:
+        store_generation(prompt_key, answer)
+
+# Greetings and thanks that never need document context
+SMALL_TALK = frozenset({
+    "hi", "hello", "hey", "thanks", "thank you", "ok", "okay", "bye",
+    "สวัสดี", "สวัสดีครับ", "สวัสดีค่ะ", "สวัสดีคะ", "หวัดดี", "หวัดดีครับ", "หวัดดีค่ะ",
+    "ขอบคุณ", "ขอบคุณครับ", "ขอบคุณค่ะ", "ขอบใจ", "โอเค", "ครับ", "ค่ะ", "ลาก่อน",
+})
+
+def is_small_talk(message):
+    """Return True for greetings and thanks, which skip document retrieval"""
+    return message.strip().strip("!?.~ ").lower() in SMALL_TALK
+
+# Fixed parts of the system prompt; only the question and context change per turn
+SYSTEM_PROMPT_INTRO = """You are a helpful assistant that answers questions based on the provided context.
+Use the information from the context below to answer the user's question: \""""
+
+SYSTEM_PROMPT_RULES = """
 Instructions:
 
 1. ตอบตามข้อมูลในเอกสารเป็นหลัก
@@ -86,83 +268,157 @@ Instructions:
 4. ตอบอย่าใช้คำว่า ตามข้อมูลที่ให้มา ไม่ให้ใช้คำว่าเอกสาร ให้ตอบข้อมูลในเอกสารไปตรงๆ
 5. ถ้าถามเกี่ยวกับ มหากรุณา ให้ตอบว่า ให้ฟังสัจธรรมวัดร่มโพธิธรรม จ.เลย"""
 
-                    # Format conversation for Gemini
-                    # Convert messages to Gemini format
-                    gemini_messages = []
+def get_assistant_response(messages):
+    user_message = messages[-1]["content"]
+
+    # Don't spend a retrieval + LLM round trip on empty or single-character input
+    if len(user_message.strip()) < 2:
+        return iter(["Please enter a question."])
+
+    # Repeat the previous answer when the same question is sent twice in a row (e.g. a double submit)
+    if (len(messages) >= 3 and messages[-2]["role"] == "assistant"
+            and messages[-3]["role"] == "user" and messages[-3]["content"] == user_message):
+        return iter([messages[-2]["content"]])
+
+    # Admins always get a fresh answer, so changes to the documents can be checked,
+    # and they alone see the retrieval steps; other users just see the spinner
+    is_admin = st.session_state.get("is_admin", False)
+    use_cache = not is_admin
+
+    # Serve a previous answer to a near-identical question without retrieval or generation.
+    # The answer cache is keyed on the question alone, so it is only used for the first
+    # question of a conversation; a follow-up like "tell me more" depends on the history.
+    doc_processor = get_doc_processor()
+    first_turn = not any(msg["role"] == "user" for msg in messages[:-1])
+    use_answer_cache = use_cache and first_turn
+    cached_response = doc_processor.lookup_response(user_message) if use_answer_cache else None
+    if cached_response is not None:
+        return iter([cached_response])
+
+    status_placeholder = None
+    try:
+        status_placeholder = st.empty()
+
+        with status_placeholder:
+            with st.status("✨ Processing your request...") as status:
+                # Extract keywords from user message; small talk needs no document lookup
+                keywords = extract_keywords(user_message)
+                if keywords and is_admin:
+                    status.update(label=f"🔎 Searching for: {', '.join(keywords)}")
 
-                    # Add system prompt as first user message
-                    gemini_messages.append({"role": "user", "parts": [system_prompt]})
-                    gemini_messages.append({"role": "model", "parts": ["I'll help answer based on the context provided."]})
+                # Repeated questions are served from the retrieval cache
+                unique_chunks = retrieve_context(user_message)
 
-                    # Add recent conversation history
-                    recent_messages = messages[-2:] if len(messages) > 2 else messages
-                    for msg in recent_messages:
-                        role = "user" if msg["role"] == "user" else "model"
-                        gemini_messages.append({"role": role, "parts": [msg["content"]]})
+                if unique_chunks:
+                    if is_admin:
+                        status.update(label=f"📚 Found {len(unique_chunks)} relevant passages")
 
-                else:
-                    status.write("No relevant documents found, using general knowledge...")
-                    # Convert messages to Gemini format
-                    gemini_messages = []
-                    recent_messages = messages[-3:] if len(messages) > 3 else messages
-                    for msg in recent_messages:
-                        role = "user" if msg["role"] == "user" else "model"
-                        gemini_messages.append({"role": role, "parts": [msg["content"]]})
-
-                status.write("Generating response...")
-                try:
-                    # Create a chat session
-                    chat = model.start_chat(history=gemini_messages[:-1])
-
-                    # Generate response
-                    response = chat.send_message(
-                        gemini_messages[-1]["parts"][0],
-                        generation_config={
-                            "max_output_tokens": 500,
-                            "temperature": 0.7,
-                            "top_p": 0.9
-                        }
-                    )
+                    # Combine the most relevant chunks within the context budget
+                    combined_chunks = build_context(unique_chunks)
 
-                except Exception as e:
-                    if "429" in str(e):  # Rate limit exceeded
-                        if handle_rate_limit_error(e):
-                            # If rate limited, retry after waiting
-                            return get_assistant_response(messages)
-                        return "Rate limit exceeded. Please try again in a few moments."
-                    raise e
+                    # Create system message with context
+                    system_prompt = "".join([SYSTEM_PROMPT_INTRO, user_message, '"\n\nContext:\n', combined_chunks, "\n", SYSTEM_PROMPT_RULES])
+
+                    # System prompt as the first user message, followed by recent conversation history
+                    gemini_messages = [
+                        {"role": "user", "parts": [system_prompt]},
+                        {"role": "model", "parts": ["I'll help answer based on the context provided."]},
+                        *to_gemini_messages(trim_history(messages[-2:]))
+                    ]
+
+                else:
+                    if is_admin:
+                        status.update(label="No relevant documents found, using general knowledge...")
+                    gemini_messages = to_gemini_messages(trim_history(messages[-3:]))
+
+                # Same context, history and question: reuse the answer without calling Gemini
+                prompt_key = generation_cache_key(gemini_messages)
+                cached_generation = lookup_generation(prompt_key) if use_cache else None
+                if cached_generation is not None:
+                    status_placeholder.empty()
+                    return iter([cached_generation])
+
+                if is_admin:
+                    status.update(label="✍️ Generating response...")
+                model = init_gemini_model()
+                # Wait for our share of the request rate rather than provoking a 429. One
+                # token per request: retries are already spaced out by the backoff.
+                rate_limiter = get_rate_limiter()
+                wait = rate_limiter.reserve() if rate_limiter is not None else 0.0
+                if wait > 0:
+                    status.update(label=f"High demand, waiting {wait:.0f} seconds...")
+                    time.sleep(wait)
+
+                for attempt in range(MAX_RETRIES + 1):
+                    try:
+                        # Create a chat session
+                        chat = model.start_chat(history=gemini_messages[:-1])
+
+                        # Stream the response so tokens render as soon as they arrive
+                        response = chat.send_message(
+                            gemini_messages[-1]["parts"][0],
+                            generation_config={
+                                "max_output_tokens": 500,
+                                "temperature": 0.7,
+                                "top_p": 0.9
+                            },
+                            stream=True
+                        )
+                        break
+
+                    except Exception as e:
+                        if not is_rate_limit_error(e):
+                            raise e
+                        # Retry with backoff until the retry budget is used up
+                        if not handle_rate_limit_error(e, attempt):
+                            status_placeholder.empty()
+                            return iter(["Rate limit exceeded. Please try again in a few moments."])
 
         status_placeholder.empty()
-        return response.text
+        return stream_and_cache(stream_response_text(response), user_message if first_turn else None, prompt_key)
 
     except Exception as e:
-        if 'status_placeholder' in locals():
+        if status_placeholder is not None:
             status_placeholder.empty()
         st.error(f"Error: {str(e)}")
         return None
 
-def process_uploaded_file(uploaded_file):
-    try:
-        # Save the uploaded file temporarily
-        temp_file_path = f"temp_{uploaded_file.name}"
-        with open(temp_file_path, "wb") as f:
-            f.write(uploaded_file.getvalue())
-
-        # Process the file using SimpleDocumentProcessor - show notifications for admin users
-        doc_processor = SimpleDocumentProcessor(show_notifications=True)
-        processed_chunks = doc_processor.process_file(temp_file_path, uploaded_file.name)
+# Uploaded files processed concurrently; embedding runs in ONNX Runtime outside the GIL,
+# so one file's inference overlaps another's splitting and database writes
+UPLOAD_WORKERS = 4
 
-        if processed_chunks:
-            st.success('File processed successfully!')
+def process_uploaded_file(uploaded_file, progress_callback=None):
+    temp_file_path = None
+    try:
+        doc_processor = get_doc_processor()
+        uploaded_file.seek(0)
+
+        if uploaded_file.name.lower().endswith('.pdf'):
+            # The PDF loader needs a path: stream the upload into a uniquely named
+            # temporary file instead of materializing it with getvalue()
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+                temp_file_path = temp_file.name
+                shutil.copyfileobj(uploaded_file, temp_file, length=1024 * 1024)
+            processed_chunks = doc_processor.process_file(temp_file_path, uploaded_file.name, progress_callback)
         else:
+            # Plain text is split straight from memory, skipping the disk round-trip
+            processed_chunks = doc_processor.process_content(
+                uploaded_file.read().decode('utf-8'), uploaded_file.name, progress_callback
+            )
+        clear_query_caches()
+
+        # The caller reports success; only flag the empty case here
+        if not processed_chunks:
             st.warning('No chunks were processed from the uploaded file.')
 
-        # Clean up the temporary file
-        os.remove(temp_file_path)
         return True
     except Exception as e:
         st.error(f"Error processing file: {str(e)}")
         return False
+    finally:
+        # Clean up the temporary file, even if processing failed
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
 
 def init_session_state():
     if "messages" not in st.session_state:
@@ -172,6 +428,11 @@ def init_session_state():
     if "show_login" not in st.session_state:
         st.session_state.show_login = False
 
+@st.cache_resource
+def get_admin_password_digest(admin_password):
+    """Hash the configured admin password once per value, so rotating the secret takes effect"""
+    return hashlib.sha256(admin_password.encode()).digest()
+
 def admin_login():
     """Handle admin login"""
     if "ADMIN_PASSWORD" not in st.secrets:
@@ -184,8 +445,8 @@ def admin_login():
             st.session_state.login_error = False
         if "clear_password" not in st.session_state:
             st.session_state.clear_password = False
-        if "pw_key" not in st.session_state:
-            st.session_state.pw_key = "admin_password_0"
+        if "pw_nonce" not in st.session_state:
+            st.session_state.pw_nonce = 0
 
         # Show error message if login failed
         if st.session_state.login_error:
@@ -195,17 +456,17 @@ def admin_login():
         # Create a container for login elements
         if st.session_state.clear_password:
             st.session_state.clear_password = False
-            st.session_state.pw_key = f"admin_password_{datetime.now().timestamp()}"
+            # A new key gives an empty password field; a counter keeps the key deterministic
+            st.session_state.pw_nonce += 1
 
-        password = st.text_input("Password", type="password", key=st.session_state.pw_key)
+        password = st.text_input("Password", type="password", key=f"admin_password_{st.session_state.pw_nonce}")
 
         # Check for Enter key press or button click
         if st.button("Login") or (password and password.strip() != ""):
-            # Convert both passwords to strings and strip whitespace
-            entered_pass = str(password).strip()
-            stored_pass = str(st.secrets["ADMIN_PASSWORD"]).strip()
+            # Compare fixed-length digests in constant time so timing doesn't leak the password
+            entered_digest = hashlib.sha256(str(password).strip().encode()).digest()
 
-            if entered_pass == stored_pass:
+            if hmac.compare_digest(entered_digest, get_admin_password_digest(str(st.secrets["ADMIN_PASSWORD"]).strip())):
                 if "is_admin" not in st.session_state:
                     st.session_state.is_admin = False
                 st.session_state.is_admin = True
@@ -228,60 +489,73 @@ def show_document_management():
     """Display document management interface for admins"""
     st.sidebar.header("Document Management")
 
-    # Add file uploader in the sidebar
-    key = f"file_uploader_{datetime.now().timestamp()}" if st.session_state.should_clear else "file_uploader"
-    uploaded_file = st.sidebar.file_uploader(
-        label="Upload a document",
-        type=["txt", "md"],
-        help="Upload a text or markdown file to include in the conversation",
+    # Add file uploader in the sidebar - bumping the nonce gives a fresh, empty uploader
+    key = f"file_uploader_{st.session_state.uploader_nonce}"
+    new_files = st.sidebar.file_uploader(
+        label="Upload documents",
+        type=["txt", "md", "pdf"],
+        help="Upload text, markdown or PDF files to include in the conversation",
+        accept_multiple_files=True,
         key=key,
         label_visibility="collapsed"
     )
 
-    # Create a sidebar container for processing status
-    status_container = st.sidebar.container()
-
-    # Reset should_clear after creating new uploader
-    if st.session_state.should_clear:
-        st.session_state.should_clear = False
-
-    # Process uploaded file
-    if uploaded_file and not st.session_state.uploaded_file_processed:
-        with status_container:
-            progress_bar = st.progress(0)
-            st.caption(f'Processing: {uploaded_file.name}')
-
-            success = process_uploaded_file(uploaded_file)
-            progress_bar.progress(100)
-
-            if success:
-                st.success('File processed successfully!')
-                st.session_state.should_clear = True
-                st.session_state.uploaded_file_processed = True
-                st.rerun()
-
-    # Display uploaded files with delete buttons
-    doc_processor = SimpleDocumentProcessor()
-    uploaded_files = doc_processor.get_uploaded_files()
+    # Process uploaded files, reporting progress as chunks (one file) or files (several) finish
+    if new_files and not st.session_state.uploaded_file_processed:
+        with st.sidebar.status(f"Processing {len(new_files)} file(s)...") as status:
+            if len(new_files) == 1:
+                success = process_uploaded_file(
+                    new_files[0],
+                    lambda done, total: status.update(label=f"Embedded {done}/{total} chunks")
+                )
+            else:
+                # Workers need the script context for their error messages and toasts
+                process_one = with_script_context(process_uploaded_file)
+                with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(new_files))) as executor:
+                    futures = [executor.submit(process_one, new_file) for new_file in new_files]
+                    results = []
+                    for future in as_completed(futures):
+                        results.append(future.result())
+                        status.update(label=f"Processed {len(results)}/{len(new_files)} files")
+                success = all(results)
+            status.update(
+                label="Files processed successfully!" if success else "Processing failed",
+                state="complete" if success else "error"
+            )
+
+        if success:
+            st.session_state.uploader_nonce += 1
+            st.session_state.uploaded_file_processed = True
+            st.rerun()
+
+    # Display uploaded files with checkboxes and a single delete button
+    doc_processor = get_doc_processor()
+    uploaded_files = get_uploaded_files_cached()
     if uploaded_files:
         st.sidebar.subheader("Uploaded Files")
-        for file in uploaded_files:
-            col1, col2 = st.sidebar.columns([4, 1])
-            with col1:
-                st.text(f"• {file}")
-            with col2:
-                if st.button("🗑️", key=f"delete_{file}"):
-                    doc_processor.remove_file(file)
-                    st.rerun()
+        selected_files = [
+            file for file in sorted(uploaded_files)
+            if st.sidebar.checkbox(file, key=f"select_{file}")
+        ]
+
+        # Delete all selected files at once, with a single rerun
+        if st.sidebar.button("🗑️ Delete Selected", disabled=not selected_files):
+            doc_processor.remove_files(selected_files)
+            clear_query_caches()
+            st.rerun()
 
     # Reset the processed flag when no file is uploaded
-    if not uploaded_file:
+    if not new_files:
         st.session_state.uploaded_file_processed = False
 
-def display_message(role: str, content: str):
-    """Display a chat message with custom styled icons"""
-    # Add custom CSS for avatar styling
-    st.markdown("""
+# Messages kept in the session; older ones are dropped so each rerun replays a bounded history
+MAX_STORED_MESSAGES = 50
+
+# Chat avatars by role: sun for the assistant, candle for the user
+AVATARS = {"assistant": "☀️", "user": "🕯️"}
+
+# Custom CSS for avatar styling
+AVATAR_CSS = """
         <style>
         /* Style for AI assistant avatar */
         [data-testid="chat-message-avatar-assistant"] {
@@ -297,22 +571,40 @@ def display_message(role: str, content: str):
             border-radius: 50% !important;
         }
         </style>
-    """, unsafe_allow_html=True)
-
-    # Set icons with custom colors
-    icon = "☀️" if role == "assistant" else "🕯️"  # Lotus for AI, sparkles for user
-    with st.chat_message(role, avatar=icon):
-        # Only display content for assistant messages without the role
-        if role == "assistant":
-            st.write(content)  # Display content without the role
-        else:
-            st.write(content)  # Display content for user
+    """
+
+def display_message(role: str, content: str):
+    """Display a chat message with custom styled icons"""
+    with st.chat_message(role, avatar=AVATARS[role]):
+        # Messages are always strings, so skip st.write's type dispatch
+        st.markdown(content)
+
+def render_history():
+    """Render the chat history"""
+    for message in st.session_state.messages:
+        display_message(message["role"], message["content"])
+
+# Files reindexed concurrently; the embedding model already spreads each batch over
+# several cores, so a few workers are enough to overlap database and network time
+REINDEX_WORKERS = 4
 
 def reindex_documents():
     """Reindex all documents in the database."""
     try:
-        doc_processor = SimpleDocumentProcessor(show_notifications=True)
-        uploaded_files = doc_processor.get_uploaded_files()
+        doc_processor = get_doc_processor()
+
+        # Fetch all chunks once and group their contents by file, in chunk order.
+        # The grouping doubles as the file list, so no separate file lookup is needed.
+        chunks_by_file = defaultdict(list)
+        sources = {}
+        for chunk in doc_processor.db.get_document_chunks():
+            base_name, _, chunk_index = chunk['id'].rpartition('_')
+            if not base_name:
+                continue
+            order = int(chunk_index) if chunk_index.isdigit() else 0
+            chunks_by_file[base_name].append((order, chunk['content']))
+            sources.setdefault(base_name, (chunk.get('metadata') or {}).get('source'))
+        uploaded_files = sorted(chunks_by_file)
 
         # Initialize the progress bar
         progress_bar = st.progress(0)
@@ -322,36 +614,27 @@ def reindex_documents():
         # Create a placeholder for the current file message
         current_file_placeholder = st.empty()
 
-        for index, file in enumerate(uploaded_files):
-            # Display the current file being indexed
-            current_file_placeholder.text(f"Currently indexing: {file}")  # Show the current file name
-
-            # Fetch the document content from database
-            document_chunks = doc_processor.db.get_document_chunks()
-
-            # Find the content for the current file
-            document_content = ""
-            for chunk in document_chunks:
-                if chunk['id'].startswith(file):
-                    document_content += chunk['content'] + "\n"
-
-            if document_content:
-                # Create a temporary file to process the content
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as temp_file:
-                    temp_file.write(document_content.encode('utf-8'))
-                    temp_file_path = temp_file.name
+        # Existing chunks keep their original splits - only the embeddings are rebuilt.
+        # Workers need the script context for the processor's toasts.
+        reindex_one = with_script_context(doc_processor.reindex_existing_chunks)
+        with ThreadPoolExecutor(max_workers=REINDEX_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    reindex_one,
+                    file,
+                    [content for _, content in sorted(chunks_by_file[file])],
+                    sources.get(file)
+                ): file
+                for file in uploaded_files
+            }
 
-                # Process the temporary file to reindex
-                doc_processor.process_file(temp_file_path, file)
+            # Update the progress as each file finishes
+            for index, future in enumerate(as_completed(futures)):
+                future.result()
+                current_file_placeholder.text(f"Indexed: {futures[future]}")
+                progress_bar.progress((index + 1) / total_files)
 
-                # Update the progress bar
-                progress = (index + 1) / total_files
-                progress_bar.progress(progress)
-
-                # Optionally delete the temporary file after processing
-                os.remove(temp_file_path)
-            else:
-                st.toast(f"No content found for {file}. Skipping.", icon="⚠️")
+        clear_query_caches()
 
         # Complete the progress bar
         progress_bar.progress(1.0)  # Set to 100%
@@ -368,7 +651,7 @@ def reindex_documents():
 def sync_database():
     """Sync local database with Supabase."""
     try:
-        doc_processor = SimpleDocumentProcessor(show_notifications=True)
+        doc_processor = get_doc_processor()
 
         # Check if Supabase is available
         if not doc_processor.db.supabase_available:
@@ -386,6 +669,7 @@ def sync_database():
             st.write("Step 1: Importing data from Supabase...")
             progress_bar.progress(25)
             doc_processor.import_from_supabase()
+            clear_query_caches()
 
             # Then sync from local to Supabase
             st.write("Step 2: Exporting local changes to Supabase...")
@@ -404,17 +688,8 @@ def sync_database():
     except Exception as e:
         st.error(f"Error during sync: {str(e)}")
 
-def main():
-    check_api_key()  # Now checks for GEMINI_API_KEY
-    st.set_page_config(
-        page_title="Beyond Path",
-        page_icon="☀️",
-        initial_sidebar_state="collapsed",
-        layout="centered"
-    )
-
-    # Add custom CSS to style the menu button and center content
-    st.markdown("""
+# Page-level CSS, built once at import instead of on every rerun
+PAGE_CSS = """
         <style>
         #MainMenu {visibility: visible;}
         [data-testid="collapsedControl"] {
@@ -471,30 +746,50 @@ def main():
             content: url("data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 100 100'%3E%3Ctext y='.9em' font-size='90'%3E☀️%3C/text%3E%3C/svg%3E");
         }
         </style>
-        """, unsafe_allow_html=True)
-
-    # Custom title with lotus image
-    def get_base64_image(image_path):
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode()
-        return encoded_string
-
-    # Convert the image and embed it in HTML
-    image_base64 = get_base64_image("assets/lotus.png")
-    st.markdown(f"""
+        """
+
+@st.cache_data(show_spinner=False)
+def get_base64_image(image_path, mtime=None):
+    """Read and base64-encode an image once; reruns are served from the cache
+
+    Passing the file's modification time as ``mtime`` re-encodes it after the file changes.
+    """
+    with open(image_path, "rb") as image_file:
+        encoded_string = base64.b64encode(image_file.read()).decode()
+    return encoded_string
+
+@st.cache_data(show_spinner=False)
+def get_header_html(image_path, mtime):
+    """Build the page styling and lotus title markup once per image version"""
+    image_base64 = get_base64_image(image_path, mtime)
+    return PAGE_CSS + AVATAR_CSS + f"""
         <div style="text-align: center;">
             <img src="data:image/png;base64,{image_base64}" alt="Lotus" style="width: 120px; height: auto; margin-left: -30px;"/>
             <h1>Beyond Path</h1>
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+def main():
+    check_api_key()  # Now checks for GEMINI_API_KEY
+    st.set_page_config(
+        page_title="Beyond Path",
+        page_icon="☀️",
+        initial_sidebar_state="collapsed",
+        layout="centered"
+    )
+
+    # Page and avatar styling plus the lotus title, built once and sent as a single element.
+    # Streamlit drops elements that aren't re-emitted, so this still runs on every rerun.
+    lotus_path = "assets/lotus.png"
+    st.markdown(get_header_html(lotus_path, os.path.getmtime(lotus_path)), unsafe_allow_html=True)
 
     init_session_state()
 
     # Initialize states for file processing
     if "uploaded_file_processed" not in st.session_state:
         st.session_state.uploaded_file_processed = False
-    if "should_clear" not in st.session_state:
-        st.session_state.should_clear = False
+    if "uploader_nonce" not in st.session_state:
+        st.session_state.uploader_nonce = 0
 
     # Sidebar admin section
     with st.sidebar:
@@ -507,8 +802,8 @@ def main():
             # Add database status and sync options
             st.sidebar.header("Database Management")
 
-            # Create a document processor to check database status - show notifications for admin
-            doc_processor = SimpleDocumentProcessor(show_notifications=True)
+            # Use the shared document processor to check database status
+            doc_processor = get_doc_processor()
             status = doc_processor.db.get_sync_status()
 
             # Display database status
@@ -534,10 +829,7 @@ def main():
                     reindex_documents()
 
     # Display chat messages
-    for message in st.session_state.messages:
-        role = message["role"]
-        content = message["content"]
-        display_message(role, content)
+    render_history()
 
     # User input
     user_input = st.chat_input("Type your message here...")
@@ -549,16 +841,25 @@ def main():
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": user_input})
 
-        # Create a placeholder for the assistant's response
-        # Get and display assistant response
-        assistant_response = get_assistant_response(st.session_state.messages)
+        # Get the assistant response stream and render tokens as they arrive
+        response_stream = get_assistant_response(st.session_state.messages)
+
+        assistant_response = None
+        if response_stream:
+            with st.chat_message("assistant", avatar=AVATARS["assistant"]):
+                try:
+                    assistant_response = st.write_stream(response_stream)
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
 
         if assistant_response:
-            display_message("assistant", assistant_response)
             # Add assistant response to chat history
             st.session_state.messages.append({"role": "assistant", "content": assistant_response})
         else:
             st.error("Failed to get response. Please try again.")
 
+        # Keep only the most recent messages (in place, so the session list isn't copied)
+        del st.session_state.messages[:-MAX_STORED_MESSAGES]
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
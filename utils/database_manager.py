@@ -1,13 +1,23 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import threading
 import time
-import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import json
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Set, Tuple
 import numpy as np
 
-from .supabase_config import SupabaseManager
+from .supabase_config import SupabaseManager, UPSERT_BATCH_SIZE
 from .sqlite_manager import SQLiteManager
 
+# Upsert batches sent to Supabase concurrently during a sync
+SYNC_WORKERS = 4
+
+# Seconds to wait before probing Supabase again after a failure, doubling on each
+# failed probe up to the maximum
+SUPABASE_RETRY_DELAY = 5.0
+SUPABASE_MAX_RETRY_DELAY = 300.0
+
 class DatabaseManager:
     """Hybrid database manager that can use either Supabase or SQLite."""
 
@@ -22,6 +32,12 @@ class DatabaseManager:
         self.supabase = None
         self.supabase_available = False
         self.show_notifications = show_notifications
+        # While Supabase is down, requests go straight to SQLite until this time
+        self._next_supabase_probe = 0.0
+        self._supabase_retry_delay = SUPABASE_RETRY_DELAY
+        # Background and manual syncs run one at a time, so an older upsert of a
+        # chunk can never land after a newer one
+        self._sync_lock = threading.Lock()
 
         # Try to initialize Supabase if credentials are available
         try:
@@ -50,14 +66,35 @@ class DatabaseManager:
 
             # If we get here, Supabase is available
             self.supabase_available = True
+            self._supabase_retry_delay = SUPABASE_RETRY_DELAY
             return True
         except Exception as e:
             if self.show_notifications:
                 st.toast(f"Supabase connection failed: {str(e)}. Using local database.", icon="⚠️")
-            self.supabase_available = False
+            self._mark_supabase_unavailable()
+            return False
+
+    def _mark_supabase_unavailable(self):
+        """Fall back to SQLite and schedule the next Supabase probe with exponential backoff."""
+        self.supabase_available = False
+        self._next_supabase_probe = time.monotonic() + self._supabase_retry_delay
+        self._supabase_retry_delay = min(self._supabase_retry_delay * 2, SUPABASE_MAX_RETRY_DELAY)
+
+    def _use_supabase(self) -> bool:
+        """Whether to send a request to Supabase, probing it again once the backoff expires.
+
+        Returns:
+            bool: True if Supabase is available, False otherwise
+        """
+        if not self.supabase:
+            return False
+        if self.supabase_available:
+            return True
+        if time.monotonic() < self._next_supabase_probe:
             return False
+        return self.check_supabase_connection()
 
-    def store_document_chunk(self, chunk_id: str, content: str, embedding: list, metadata: dict) -> bool:
+    def store_document_chunk(self, chunk_id: str, content: str, embedding: np.ndarray, metadata: dict) -> bool:
         """Store document chunk in the appropriate database.
 
         Args:
@@ -73,7 +110,7 @@ class DatabaseManager:
         sqlite_success = self.sqlite.store_document_chunk(chunk_id, content, embedding, metadata)
 
         # If Supabase is available, store there too and mark as synced in SQLite
-        if self.supabase_available and self.supabase:
+        if self._use_supabase():
             try:
                 supabase_success = self.supabase.store_document_chunk(chunk_id, content, embedding, metadata)
                 if supabase_success and sqlite_success:
@@ -92,16 +129,32 @@ class DatabaseManager:
         Returns:
             List of document chunks
         """
-        if self.supabase_available and self.supabase:
+        if self._use_supabase():
             try:
                 return self.supabase.get_document_chunks()
             except Exception as e:
                 if self.show_notifications:
                     st.toast(f"Error getting chunks from Supabase: {str(e)}. Using local database.", icon="⚠️")
-                self.supabase_available = False
+                self._mark_supabase_unavailable()
 
         return self.sqlite.get_document_chunks()
 
+    def get_file_ids(self) -> Set[str]:
+        """Get the distinct base filenames from the appropriate database.
+
+        Returns:
+            Set of base filenames
+        """
+        if self._use_supabase():
+            try:
+                return self.supabase.get_file_ids()
+            except Exception as e:
+                if self.show_notifications:
+                    st.toast(f"Error getting files from Supabase: {str(e)}. Using local database.", icon="⚠️")
+                self._mark_supabase_unavailable()
+
+        return self.sqlite.get_file_ids()
+
     def delete_document_chunks(self, base_filename: str) -> bool:
         """Delete document chunks from the appropriate database.
 
@@ -115,14 +168,38 @@ class DatabaseManager:
         sqlite_success = self.sqlite.delete_document_chunks(base_filename)
 
         # If Supabase is available, delete there too
-        if self.supabase_available and self.supabase:
+        if self._use_supabase():
             try:
                 supabase_success = self.supabase.delete_document_chunks(base_filename)
                 return sqlite_success and supabase_success
             except Exception as e:
                 if self.show_notifications:
                     st.toast(f"Error deleting from Supabase: {str(e)}. Deleted locally only.", icon="⚠️")
-                self.supabase_available = False
+                self._mark_supabase_unavailable()
+
+        return sqlite_success
+
+    def delete_files(self, base_filenames: List[str]) -> bool:
+        """Delete the chunks of several files with one request per database.
+
+        Args:
+            base_filenames: Base filenames to match for deletion
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        # Always delete from local SQLite
+        sqlite_success = self.sqlite.delete_files(base_filenames)
+
+        # If Supabase is available, delete there too
+        if self._use_supabase():
+            try:
+                supabase_success = self.supabase.delete_files(base_filenames)
+                return sqlite_success and supabase_success
+            except Exception as e:
+                if self.show_notifications:
+                    st.toast(f"Error deleting from Supabase: {str(e)}. Deleted locally only.", icon="⚠️")
+                self._mark_supabase_unavailable()
 
         return sqlite_success
 
@@ -136,36 +213,38 @@ class DatabaseManager:
         Returns:
             List of matching document chunks
         """
-        if self.supabase_available and self.supabase:
+        if self._use_supabase():
             try:
                 return self.supabase.search_keyword(keyword, limit)
             except Exception as e:
                 if self.show_notifications:
                     st.toast(f"Error searching Supabase: {str(e)}. Using local database.", icon="⚠️")
-                self.supabase_available = False
+                self._mark_supabase_unavailable()
 
         return self.sqlite.search_keyword(keyword, limit)
 
-    def query_similar(self, query: str, query_embedding: list, n_results: int = 10) -> List[Dict[str, Any]]:
+    def query_similar(self, query: str, query_embedding: np.ndarray, n_results: int = 10,
+                      keywords: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Query similar documents from the appropriate database.
 
         Args:
             query: Query text
             query_embedding: Vector embedding of the query
             n_results: Maximum number of results to return
+            keywords: Keywords to match in a single search instead of the whole query
 
         Returns:
             List of matching document chunks
         """
-        if self.supabase_available and self.supabase:
+        if self._use_supabase():
             try:
-                return self.supabase.query_similar(query, query_embedding, n_results)
+                return self.supabase.query_similar(query, query_embedding, n_results, keywords)
             except Exception as e:
                 if self.show_notifications:
                     st.toast(f"Error querying Supabase: {str(e)}. Using local database.", icon="⚠️")
-                self.supabase_available = False
+                self._mark_supabase_unavailable()
 
-        return self.sqlite.query_similar(query, query_embedding, n_results)
+        return self.sqlite.query_similar(query, query_embedding, n_results, keywords)
 
     def sync_to_supabase(self) -> Tuple[int, int, str]:
         """Sync local database to Supabase.
@@ -180,30 +259,51 @@ class DatabaseManager:
         if not self.check_supabase_connection():
             return 0, 0, "Supabase not available"
 
-        # Get unsynced chunks
-        unsynced_chunks = self.sqlite.get_unsynced_chunks()
-        total_chunks = len(unsynced_chunks)
+        with self._sync_lock:
+            return self._sync_unsynced_chunks()
 
-        if total_chunks == 0:
-            self.sqlite.update_sync_status(int(time.time()), "All chunks synced")
-            return 0, 0, "All chunks already synced"
+    def _sync_unsynced_chunks(self) -> Tuple[int, int, str]:
+        """Upsert every unsynced local chunk to Supabase; see sync_to_supabase."""
+        # Stream unsynced chunks to Supabase in bulk upserts, several batches in flight at
+        # once, marking each batch as synced once it lands. Only a bounded number of
+        # batches is held in memory rather than every unsynced chunk.
+        ctx = get_script_run_ctx()
+
+        def upsert_batch(batch: List[Dict[str, Any]]) -> bool:
+            # Let the Supabase manager report errors from the worker thread
+            add_script_run_ctx(threading.current_thread(), ctx)
+            return self.supabase.store_document_chunks(batch)
 
-        # Sync chunks to Supabase
         synced_count = 0
-        for chunk in unsynced_chunks:
+        total_chunks = 0
+
+        def finish(done) -> None:
+            nonlocal synced_count
+            for future in done:
+                start, batch = pending.pop(future)
+                try:
+                    if future.result():
+                        self.sqlite.mark_chunks_synced(batch)
+                        synced_count += len(batch)
+                except Exception as e:
+                    st.toast(f"Error syncing chunks {start + 1}-{start + len(batch)}: {str(e)}", icon="⚠️")
+
+        pending = {}
+        with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as executor:
             try:
-                success = self.supabase.store_document_chunk(
-                    chunk_id=chunk['id'],
-                    content=chunk['content'],
-                    embedding=chunk['embedding'],
-                    metadata=chunk['metadata']
-                )
-
-                if success:
-                    self.sqlite.mark_as_synced(chunk['id'])
-                    synced_count += 1
+                for batch in self.sqlite.iter_document_chunks(UPSERT_BATCH_SIZE, unsynced_only=True):
+                    pending[executor.submit(upsert_batch, batch)] = (total_chunks, batch)
+                    total_chunks += len(batch)
+                    if len(pending) >= SYNC_WORKERS * 2:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        finish(done)
             except Exception as e:
-                st.toast(f"Error syncing chunk {chunk['id']}: {str(e)}", icon="⚠️")
+                st.toast(f"Error reading unsynced chunks: {str(e)}", icon="⚠️")
+            finish(list(pending))
+
+        if total_chunks == 0:
+            self.sqlite.update_sync_status(int(time.time()), "All chunks synced")
+            return 0, 0, "All chunks already synced"
 
         # Update sync status
         status = f"Synced {synced_count}/{total_chunks} chunks"
@@ -225,29 +325,20 @@ class DatabaseManager:
             return 0, 0, "Supabase not available"
 
         try:
-            # Get all chunks from Supabase
-            supabase_chunks = self.supabase.get_document_chunks()
-            total_chunks = len(supabase_chunks)
+            # Page through Supabase, storing each page in the local database in one
+            # transaction, already marked as synced
+            synced_count = 0
+            total_chunks = 0
+            for page in self.supabase.iter_document_chunks():
+                total_chunks += len(page)
+                if self.sqlite.store_document_chunks(page, synced=True):
+                    synced_count += len(page)
 
             if total_chunks == 0:
                 return 0, 0, "No chunks in Supabase"
 
-            # Store chunks in local database
-            synced_count = 0
-            for chunk in supabase_chunks:
-                try:
-                    success = self.sqlite.store_document_chunk(
-                        chunk_id=chunk['id'],
-                        content=chunk['content'],
-                        embedding=chunk['embedding'],
-                        metadata=chunk['metadata']
-                    )
-
-                    if success:
-                        self.sqlite.mark_as_synced(chunk['id'])
-                        synced_count += 1
-                except Exception as e:
-                    st.toast(f"Error syncing chunk {chunk['id']} from Supabase: {str(e)}", icon="⚠️")
+            if synced_count < total_chunks:
+                st.toast("Error storing chunks from Supabase in the local database", icon="⚠️")
 
             # Update sync status
             status = f"Synced {synced_count}/{total_chunks} chunks from Supabase"
@@ -275,3 +366,5 @@ class DatabaseManager:
     def close(self):
         """Close database connections."""
         self.sqlite.close()
+        if self.supabase:
+            self.supabase.http_client.close()
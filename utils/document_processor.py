@@ -1,40 +1,49 @@
 import os
-from typing import List, Set
+from typing import Dict, List, Set
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-import networkx as nx
+from langchain_community.document_loaders import PyMuPDFLoader, TextLoader
 import streamlit as st
 from .supabase_config import SupabaseManager
-from sentence_transformers import SentenceTransformer
+from .simple_document_processor import embedding_providers
+from fastembed import TextEmbedding
 
 class DocumentProcessor:
     def __init__(self):
-        self.embedding_function = SentenceTransformer('all-MiniLM-L6-v2')
+        # The same all-MiniLM-L6-v2 weights, run through ONNX Runtime instead of PyTorch
+        self.embedding_function = TextEmbedding('sentence-transformers/all-MiniLM-L6-v2',
+                                                providers=embedding_providers())
         self.supabase = SupabaseManager()
-        self.graph = nx.Graph()
+        # Base id -> chunk ids in document order; chunk i neighbours chunks i - 1 and i + 1
+        self._chains: Dict[str, List[str]] = {}
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=150,
+            chunk_overlap=30,
+            separators=["\n\n", "\n", " ", ""]
+        )
         
     def get_uploaded_files(self) -> Set[str]:
         """Get list of unique uploaded files from metadata"""
         try:
-            chunks = self.supabase.get_document_chunks()
-            unique_files = set()
-            
-            for chunk in chunks:
-                # Extract the base filename (everything before the last underscore)
-                base_name = '_'.join(chunk['id'].split('_')[:-1])
-                if base_name:
-                    unique_files.add(base_name)
-                    
-            return unique_files
+            return self.supabase.get_file_ids()
         except Exception as e:
             st.toast(f"Error getting files: {str(e)}", icon="⚠️")
             return set()
             
+    def neighbors(self, chunk_id: str) -> List[str]:
+        """Get the ids of the chunks directly before and after a chunk in its document."""
+        base_id, _, index = chunk_id.rpartition('_')
+        chain = self._chains.get(base_id)
+        if not chain or not index.isdigit():
+            return []
+        i = int(index)
+        return chain[max(i - 1, 0):i] + chain[i + 1:i + 2]
+
     def remove_file(self, base_filename: str):
         """Remove a file and its chunks from Supabase."""
         try:
             # Delete all chunks associated with the base filename
             success = self.supabase.delete_document_chunks(base_filename)
+            self._chains.pop(base_filename, None)
             if success:
                 st.toast(f"Removed all chunks for {base_filename}", icon="✅")
             
@@ -50,48 +59,35 @@ class DocumentProcessor:
         """Process a file and store chunks in Supabase"""
         try:
             if file_path.endswith('.pdf'):
-                loader = PyPDFLoader(file_path)
+                loader = PyMuPDFLoader(file_path)
             else:
                 loader = TextLoader(file_path, encoding='utf-8')
             
-            documents = loader.load()
-            if not documents:
+            chunks = self.text_splitter.split_documents(loader.lazy_load())
+            if not chunks:
                 st.toast(f"No content found in {original_filename}.", icon="⚠️")
                 return []
-
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=150,
-                chunk_overlap=30,
-                separators=["\n\n", "\n", " ", ""]
-            )
-            chunks = text_splitter.split_documents(documents)
             
             # Use original filename without extension as base_id
             base_id = os.path.splitext(original_filename)[0]
             
-            # Process and store chunks
-            for i, chunk in enumerate(chunks):
-                try:
-                    chunk_id = f"{base_id}_{i}"
-                    embedding = self.embedding_function.encode([chunk.page_content])[0].tolist()
-                    
-                    # Log the chunk being stored
-                    # print(f"Storing chunk: {chunk_id} for file: {original_filename}")  # Commented out
-                    
-                    self.supabase.store_document_chunk(
-                        chunk_id=chunk_id,
-                        content=chunk.page_content,
-                        embedding=embedding,
-                        metadata={"source": original_filename}
-                    )
-                    
-                    # Add nodes and edges to graph
-                    self.graph.add_node(chunk_id, content=chunk.page_content)
-                    if i > 0:
-                        self.graph.add_edge(f"{base_id}_{i-1}", chunk_id)
-                except Exception as e:
-                    st.toast(f"Error processing chunk {i}: {str(e)}", icon="⚠️")
-                    continue
+            # Embed all chunks in batched model calls instead of one call per chunk
+            texts = [chunk.page_content for chunk in chunks]
+            embeddings = list(self.embedding_function.embed(texts, batch_size=64))
+
+            rows = [{
+                'id': f"{base_id}_{i}",
+                'content': text,
+                'embedding': embedding,
+                'metadata': {"source": original_filename}
+            } for i, (text, embedding) in enumerate(zip(texts, embeddings))]
+
+            # Store every chunk with bulk upserts
+            if not self.supabase.store_document_chunks(rows):
+                st.toast(f"Some chunks of {original_filename} could not be stored.", icon="⚠️")
+
+            # Record the chunk order so neighbouring chunks can be looked up
+            self._chains[base_id] = [row['id'] for row in rows]
             
             st.toast(f"Successfully processed {len(chunks)} chunks for {original_filename}.", icon="✅")
             return [chunk.page_content for chunk in chunks]
@@ -104,7 +100,7 @@ class DocumentProcessor:
         """Query documents for keyword matches, with similarity search as fallback."""
         try:
             # Generate embedding (only used if no keyword matches found)
-            query_embedding = self.embedding_function.encode([query])[0].tolist()
+            query_embedding = next(iter(self.embedding_function.embed([query])))
             
             # Search for matches in document_chunks
             st.write(f"\nSearching for content containing: {query}")
@@ -0,0 +1,38 @@
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Token bucket limiting how often requests are sent to an API.
+
+    Requests reserve a token before they are sent; when the bucket is empty the caller
+    is told how long to wait, so requests are spaced out instead of hitting a 429.
+    """
+
+    def __init__(self, requests_per_minute: float, capacity: Optional[float] = None):
+        """Initialize the token bucket.
+
+        Args:
+            requests_per_minute: Sustained request rate allowed
+            capacity: Largest burst allowed (defaults to one minute's worth of requests)
+        """
+        self.rate = requests_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else requests_per_minute
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, borrowing against future refills if none is left.
+
+        Returns:
+            Seconds the caller should wait before sending its request (0 if none)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
@@ -0,0 +1,133 @@
+import threading
+import time
+from typing import FrozenSet, List, Optional
+
+import numpy as np
+
+from .sqlite_manager import SQLiteManager
+
+def question_keywords(question: str) -> FrozenSet[str]:
+    """Return the set of words in a question, split the way chat keywords are."""
+    return frozenset(word for word in question.lower().split() if len(word) > 1)
+
+class SemanticCache:
+    """Cache of generated answers, looked up by question embedding similarity.
+
+    Entries are kept in memory as a matrix of L2-normalized embeddings, so a lookup
+    is a single inner-product scan, and persisted in SQLite so they survive restarts.
+    A similar embedding alone is not enough for a hit: the questions must also have
+    the same keywords, since questions differing in one word ("ทุกข์คืออะไร" and
+    "สุขคืออะไร") can embed almost identically yet need different answers.
+    """
+
+    def __init__(self, sqlite: SQLiteManager, threshold: float = 0.95,
+                 ttl: int = 24 * 60 * 60, max_entries: int = 1000):
+        """Initialize the semantic cache.
+
+        Args:
+            sqlite: SQLite manager used to persist cache entries
+            threshold: Minimum cosine similarity for a cached answer to be reused
+            ttl: Seconds after which an entry expires
+            max_entries: Maximum number of entries kept in memory
+        """
+        self.sqlite = sqlite
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._keywords: List[FrozenSet[str]] = []
+        self._responses: List[str] = []
+        self._created_at: List[int] = []
+        self._load()
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        """Return the embedding as a unit-length float32 vector, or None if it is all zeros."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _load(self):
+        """Load unexpired entries from SQLite."""
+        entries = self.sqlite.get_cached_responses(int(time.time()) - self.ttl)[-self.max_entries:]
+        vectors = []
+        for entry in entries:
+            vector = self._normalize(entry['embedding'])
+            if vector is not None:
+                vectors.append(vector)
+                self._keywords.append(question_keywords(entry['question'] or ''))
+                self._responses.append(entry['response'])
+                self._created_at.append(entry['created_at'])
+        if vectors:
+            self._vectors = np.vstack(vectors)
+
+    def lookup(self, question: str, embedding) -> Optional[str]:
+        """Find a cached answer for a question with the same keywords and a nearly identical embedding.
+
+        Args:
+            question: The question being asked
+            embedding: Vector embedding of the question
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        query = self._normalize(embedding)
+        keywords = question_keywords(question)
+        with self._lock:
+            if query is None or self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                return None
+
+            candidates = [i for i, entry_keywords in enumerate(self._keywords) if entry_keywords == keywords]
+            if not candidates:
+                return None
+            scores = self._vectors[candidates] @ query
+            best = candidates[int(np.argmax(scores))]
+            if scores.max() < self.threshold or self._created_at[best] < time.time() - self.ttl:
+                return None
+            return self._responses[best]
+
+    def add(self, question: str, embedding, response: str):
+        """Add an answer to the cache.
+
+        Args:
+            question: Question that was answered
+            embedding: Vector embedding of the question
+            response: Generated answer
+        """
+        vector = self._normalize(embedding)
+        if vector is None or not response:
+            return
+
+        with self._lock:
+            if self._vectors is not None and self._vectors.shape[1] != vector.shape[0]:
+                # Embedding model changed; start over with the new dimension
+                self._vectors = None
+                self._keywords = []
+                self._responses = []
+                self._created_at = []
+
+            self._vectors = vector[None, :] if self._vectors is None else np.vstack([self._vectors, vector])
+            self._keywords.append(question_keywords(question))
+            self._responses.append(response)
+            self._created_at.append(int(time.time()))
+
+            # Drop the oldest entries once the cache is full
+            if len(self._responses) > self.max_entries:
+                self._vectors = self._vectors[-self.max_entries:]
+                self._keywords = self._keywords[-self.max_entries:]
+                self._responses = self._responses[-self.max_entries:]
+                self._created_at = self._created_at[-self.max_entries:]
+
+        self.sqlite.store_cached_response(question, vector, response)
+
+    def clear(self):
+        """Remove all cached answers, e.g. after the documents they were based on change."""
+        with self._lock:
+            self._vectors = None
+            self._keywords = []
+            self._responses = []
+            self._created_at = []
+        self.sqlite.clear_response_cache()
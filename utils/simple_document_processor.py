@@ -1,24 +1,83 @@
+import hashlib
+import logging
 import os
-from typing import List, Set
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-import networkx as nx
+from langchain_community.document_loaders import PyMuPDFLoader
 import streamlit as st
 import numpy as np
+import onnxruntime
 from fastembed import TextEmbedding
 
 # Import the new database manager instead of directly using Supabase
 from .database_manager import DatabaseManager
+from .semantic_cache import SemanticCache
+
+logger = logging.getLogger(__name__)
+
+# Recent query embeddings kept for the semantic query cache
+SEMANTIC_CACHE_SIZE = 256
+# Minimum cosine similarity for a cached query to be reused
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# Query embeddings kept so a question is only embedded once per turn
+QUERY_EMBEDDING_CACHE_SIZE = 10000
+# FastEmbed model; FastEmbed downloads it as Qdrant's quantized ONNX export
+# (qdrant/bge-small-en-v1.5-onnx-q), 384 dimensions like the stored embeddings
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+# Chunks embedded per model call when indexing documents
+EMBEDDING_BATCH_SIZE = 64
+# Seconds without new uploads before stored chunks are synced to Supabase
+SYNC_DEBOUNCE_SECONDS = 2.0
+
+def embedding_cache_key(text: str) -> bytes:
+    """Hash a text for the embedding cache, ignoring case and whitespace differences.
+
+    Both embedding models lowercase their input and split on whitespace, so texts
+    differing only in case or spacing get the same embedding and can share a cache entry.
+    """
+    return hashlib.sha256(' '.join(text.lower().split()).encode()).digest()
+
+def embedding_providers() -> List[str]:
+    """ONNX Runtime providers for the embedding model, preferring CUDA when the GPU build is installed."""
+    if 'CUDAExecutionProvider' in onnxruntime.get_available_providers():
+        return ['CUDAExecutionProvider', 'CPUExecutionProvider']
+    return ['CPUExecutionProvider']
 
 class SimpleDocumentProcessor:
     def __init__(self, db_path: str = "data/local_db.sqlite", show_notifications: bool = False):
         # Use the hybrid database manager instead of directly using Supabase
         self.db = DatabaseManager(db_path)
-        self.graph = nx.Graph()
+        # Base id -> chunk ids in document order; chunk i neighbours chunks i - 1 and i + 1
+        self._chains: Dict[str, List[str]] = {}
+        # (normalized query embedding, (keywords, n_results), results) for recently answered queries
+        self._semantic_cache = deque(maxlen=SEMANTIC_CACHE_SIZE)
+        # Previously generated answers, looked up by question similarity
+        self.response_cache = SemanticCache(self.db.sqlite, threshold=SEMANTIC_CACHE_THRESHOLD)
+        # Query text -> embedding, in least-recently-used order
+        self._query_embeddings = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
+        # The processor is shared by every session (st.cache_resource), so writes that
+        # change the stored documents are serialized; lookups don't take the lock
+        self._write_lock = threading.Lock()
+        # Uploads request a Supabase sync; a background thread runs one per burst of uploads
+        self._sync_requested = threading.Event()
+        threading.Thread(target=self._sync_worker, name="supabase-sync", daemon=True).start()
+        # Splitter used to chunk documents; it holds only configuration, so one instance
+        # is shared by every upload
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=150,
+            chunk_overlap=30,
+            separators=["\n\n", "\n", " ", ""]
+        )
         # Initialize the FastEmbed model
         try:
-            # Use the default model (BAAI/bge-small-en-v1.5) which is known to work
-            self.embedding_model = TextEmbedding()
+            # Pin the model rather than relying on FastEmbed's default, so a FastEmbed
+            # upgrade cannot silently mix embedding spaces in the database
+            self.embedding_model = TextEmbedding(model_name=EMBEDDING_MODEL, providers=embedding_providers())
             if show_notifications:
                 st.toast(f"FastEmbed model loaded successfully: {self.embedding_model.model_name}", icon="✅")
         except Exception as e:
@@ -47,25 +106,35 @@ class SimpleDocumentProcessor:
     def get_uploaded_files(self) -> Set[str]:
         """Get list of unique uploaded files from metadata"""
         try:
-            chunks = self.db.get_document_chunks()
-            unique_files = set()
-
-            for chunk in chunks:
-                # Extract the base filename (everything before the last underscore)
-                base_name = '_'.join(chunk['id'].split('_')[:-1])
-                if base_name:
-                    unique_files.add(base_name)
-
-            return unique_files
+            return self.db.get_file_ids()
         except Exception as e:
             st.toast(f"Error getting files: {str(e)}", icon="⚠️")
             return set()
 
+    def neighbors(self, chunk_id: str) -> List[str]:
+        """Get the ids of the chunks directly before and after a chunk in its document.
+
+        Args:
+            chunk_id: Chunk id of the form "{base_id}_{index}"
+
+        Returns:
+            Ids of the adjacent chunks, in document order
+        """
+        base_id, _, index = chunk_id.rpartition('_')
+        chain = self._chains.get(base_id)
+        if not chain or not index.isdigit():
+            return []
+        i = int(index)
+        return chain[max(i - 1, 0):i] + chain[i + 1:i + 2]
+
     def remove_file(self, base_filename: str):
         """Remove a file and its chunks from the database."""
         try:
             # Delete all chunks associated with the base filename
-            success = self.db.delete_document_chunks(base_filename)
+            with self._write_lock:
+                success = self.db.delete_document_chunks(base_filename)
+                self._chains.pop(base_filename, None)
+                self.clear_query_cache()
             if success:
                 st.toast(f"Removed all chunks for {base_filename}", icon="✅")
 
@@ -74,6 +143,32 @@ class SimpleDocumentProcessor:
             st.toast(f"Error removing file: {str(e)}", icon="⚠️")
             return False
 
+    def remove_files(self, base_filenames: List[str]) -> bool:
+        """Remove several files and their chunks from the database.
+
+        Args:
+            base_filenames: Base filenames to remove
+
+        Returns:
+            bool: True if every file was removed, False otherwise
+        """
+        try:
+            if not base_filenames:
+                return True
+
+            with self._write_lock:
+                success = self.db.delete_files(base_filenames)
+                for base_filename in base_filenames:
+                    self._chains.pop(base_filename, None)
+                self.clear_query_cache()
+
+            if success:
+                st.toast(f"Removed {len(base_filenames)} file(s): {', '.join(base_filenames)}", icon="✅")
+            return success
+        except Exception as e:
+            st.toast(f"Error removing files: {str(e)}", icon="⚠️")
+            return False
+
     def sync_database(self, show_toast=True):
         """Sync local database with Supabase if available.
 
@@ -95,107 +190,378 @@ class SimpleDocumentProcessor:
             st.toast(f"Sync status: {status}", icon="ℹ️")
         return synced > 0
 
-    def get_embedding(self, text: str) -> List[float]:
+    def request_sync(self):
+        """Sync local changes to Supabase in the background once uploads pause."""
+        self._sync_requested.set()
+
+    def _sync_worker(self):
+        """Run a Supabase sync after each burst of sync requests, off the upload path."""
+        while True:
+            self._sync_requested.wait()
+            # Debounce: wait until no new request arrives for SYNC_DEBOUNCE_SECONDS
+            while self._sync_requested.is_set():
+                self._sync_requested.clear()
+                time.sleep(SYNC_DEBOUNCE_SECONDS)
+            try:
+                self.db.sync_to_supabase()
+            except Exception:
+                # No script context on this thread, so st.toast has nowhere to show
+                logger.exception("Error syncing to Supabase in the background")
+
+    def clear_query_cache(self):
+        """Forget cached query results and answers after the stored documents change."""
+        self._semantic_cache.clear()
+        self.response_cache.clear()
+
+    def lookup_response(self, question: str) -> Optional[str]:
+        """Return a previously generated answer to a near-identical question, if any.
+
+        Args:
+            question: The user's question
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        # The fallback embedding is not semantic, so only trust real model embeddings
+        if self.embedding_model is None:
+            return None
+        return self.response_cache.lookup(question, self.get_query_embedding(question))
+
+    def cache_response(self, question: str, response: str):
+        """Store a generated answer so near-identical questions can reuse it.
+
+        Args:
+            question: The user's question
+            response: The generated answer
+        """
+        if self.embedding_model is None:
+            return
+        self.response_cache.add(question, self.get_query_embedding(question), response)
+
+    def _lookup_query_cache(self, query_vector: np.ndarray, search_key: tuple) -> Optional[List[str]]:
+        """Find cached results for a query whose embedding is nearly identical.
+
+        Results depend on the keywords matched first and on the number of results, so
+        only queries with the same search key are compared.
+
+        Args:
+            query_vector: L2-normalized query embedding
+            search_key: (sorted keywords, n_results) of the query
+
+        Returns:
+            Cached results if a close enough query was seen, None otherwise
+        """
+        entries = [(vector, results) for vector, key, results in list(self._semantic_cache) if key == search_key]
+        if not entries:
+            return None
+
+        cached_vectors = np.vstack([vector for vector, _ in entries])
+        scores = cached_vectors @ query_vector
+        best = int(np.argmax(scores))
+        if scores[best] >= SEMANTIC_CACHE_THRESHOLD:
+            return entries[best][1]
+        return None
+
+    def get_embedding(self, text: str) -> np.ndarray:
         """Generate embeddings using FastEmbed or fallback to simple method"""
         if self.embedding_model is not None:
             try:
-                # FastEmbed returns a generator, convert to list first
-                embeddings = list(self.embedding_model.embed([text]))
-                if embeddings and len(embeddings) > 0:
-                    # Convert numpy array to list
-                    return embeddings[0].tolist()
-                else:
-                    st.toast("No embeddings generated, using fallback", icon="⚠️")
-                    return self.simple_embedding(text)
+                # Keep the float32 array; it is only converted at the Supabase boundary
+                return self._model_embedding(text)
             except Exception as e:
                 st.toast(f"Error generating embedding: {str(e)}", icon="⚠️")
-                # Fallback to simple embedding if FastEmbed fails
-                return self.simple_embedding(text)
-        else:
-            return self.simple_embedding(text)
-
-    def simple_embedding(self, text: str) -> List[float]:
-        """A very simple embedding function that creates a random vector.
-        Used as fallback if FastEmbed fails."""
-        # Create a random vector of length 384 (same as the original model)
-        # Use a seed based on the text to make it deterministic
-        seed = sum(ord(c) for c in text)
-        np.random.seed(seed)
-        return np.random.rand(384).tolist()
-
-    def process_file(self, file_path: str, original_filename: str) -> List[str]:
-        """Process a file and store chunks in the database"""
+        # Fallback to simple embedding if FastEmbed fails
+        return self.simple_embedding(text)
+
+    def _model_embedding(self, text: str) -> np.ndarray:
+        """Embed one text with FastEmbed, raising if no embedding is produced."""
+        # FastEmbed returns a generator, convert to list first
+        embeddings = list(self.embedding_model.embed([text]))
+        if not embeddings:
+            raise ValueError("No embeddings generated")
+        return embeddings[0]
+
+    def get_embeddings(self, texts: List[str],
+                       progress_callback: Optional[Callable[[int, int], None]] = None) -> List[np.ndarray]:
+        """Generate embeddings for many texts, reusing cached embeddings of identical text.
+
+        Embeddings are cached in SQLite by a hash of the normalized text and the model
+        name, so re-uploading or reindexing unchanged content skips the model entirely.
+
+        Args:
+            texts: Texts to embed
+            progress_callback: Called with (embedded, total) after each batch of uncached texts
+
+        Returns:
+            One embedding per text, in the same order
+        """
+        if self.embedding_model is None or not texts:
+            return [self.simple_embedding(text) for text in texts]
+
+        model = self.embedding_model.model_name
+        hashes = [embedding_cache_key(text) for text in texts]
+        embeddings = self.db.sqlite.get_cached_embeddings(hashes, model)
+
+        # Embed each distinct uncached text once
+        missing = {text_hash: text for text_hash, text in zip(hashes, texts) if text_hash not in embeddings}
+        if missing:
+            computed = {
+                text_hash: embedding
+                for text_hash, embedding in zip(missing, self._embed_texts(list(missing.values()), progress_callback))
+                if embedding is not None
+            }
+            if computed:
+                with self._write_lock:
+                    self.db.sqlite.store_cached_embeddings(computed, model)
+                embeddings.update(computed)
+
+        # Texts the model failed on get the non-semantic fallback, which is never cached
+        return [embeddings[text_hash] if text_hash in embeddings else self.simple_embedding(text)
+                for text_hash, text in zip(hashes, texts)]
+
+    def _embed_texts(self, texts: List[str],
+                     progress_callback: Optional[Callable[[int, int], None]] = None) -> List[Optional[np.ndarray]]:
+        """Embed texts with FastEmbed in batched model calls.
+
+        Args:
+            texts: Texts to embed
+            progress_callback: Called with (embedded, total) after each batch
+
+        Returns:
+            One embedding per text, in the same order; None where the model failed
+        """
         try:
-            if file_path.endswith('.pdf'):
-                loader = PyPDFLoader(file_path)
-            else:
-                loader = TextLoader(file_path, encoding='utf-8')
+            embeddings = []
+            # Keep the model's float32 arrays; the database stores them as raw bytes
+            for embedding in self.embedding_model.embed(texts, batch_size=EMBEDDING_BATCH_SIZE):
+                embeddings.append(embedding)
+                if progress_callback and (len(embeddings) % EMBEDDING_BATCH_SIZE == 0 or len(embeddings) == len(texts)):
+                    progress_callback(len(embeddings), len(texts))
+            if len(embeddings) == len(texts):
+                return embeddings
+            st.toast("Batch embedding incomplete, embedding chunks one by one", icon="⚠️")
+        except Exception as e:
+            st.toast(f"Error generating batch embeddings: {str(e)}", icon="⚠️")
+
+        # Embed one by one, collecting failures into a single toast rather than one per chunk
+        embeddings, errors = [], []
+        for text in texts:
+            try:
+                embeddings.append(self._model_embedding(text))
+            except Exception as e:
+                errors.append(str(e))
+                embeddings.append(None)
+        if errors:
+            st.toast(f"{len(errors)} of {len(texts)} chunks could not be embedded, first error: {errors[0]}",
+                     icon="⚠️")
+        return embeddings
+
+    def get_query_embedding(self, query: str) -> np.ndarray:
+        """Embed a user query, reusing the embedding of a recently seen query.
+
+        The response cache and similarity search both embed the same question
+        each turn, so the result is kept in a bounded LRU cache.
 
-            documents = loader.load()
-            if not documents:
+        Args:
+            query: The user's query
+
+        Returns:
+            The query embedding
+        """
+        # Retrieval runs lookups on worker threads, so guard the shared map
+        with self._query_embeddings_lock:
+            embedding = self._query_embeddings.get(query)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(query)
+                return embedding
+
+        embedding = self.get_embedding(query)
+        with self._query_embeddings_lock:
+            self._query_embeddings[query] = embedding
+            if len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        return embedding
+
+    def simple_embedding(self, text: str) -> np.ndarray:
+        """A very simple embedding function that hashes character trigrams into a vector.
+        Used as fallback if FastEmbed fails; texts sharing many trigrams get similar vectors."""
+        # Vector of length 384 (same as the original model). Character trigrams rather
+        # than words, since Thai is written without spaces between words.
+        vector = np.zeros(384, dtype=np.float32)
+        text = text.lower()
+        for i in range(max(len(text) - 2, 1)):
+            digest = hashlib.blake2b(text[i:i + 3].encode(), digest_size=4).digest()
+            vector[int.from_bytes(digest, 'little') % 384] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def process_file(self, file_path: str, original_filename: str,
+                     progress_callback: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """Process a file and store chunks in the database"""
+        try:
+            # Plain text needs no loader: read it and use the in-memory pipeline
+            if not file_path.endswith('.pdf'):
+                return self.process_content(Path(file_path).read_text(encoding='utf-8'), original_filename,
+                                            progress_callback)
+
+            # MuPDF extracts text in C; pages are split as they are loaded rather than
+            # holding the whole document first
+            chunks = self.text_splitter.split_documents(PyMuPDFLoader(file_path).lazy_load())
+            if not chunks:
                 st.toast(f"No content found in {original_filename}.", icon="⚠️")
                 return []
 
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=150,
-                chunk_overlap=30,
-                separators=["\n\n", "\n", " ", ""]
-            )
-            chunks = text_splitter.split_documents(documents)
+            base_id = os.path.splitext(original_filename)[0]
+            return self._store_chunks([chunk.page_content for chunk in chunks], base_id, original_filename,
+                                      progress_callback)
+
+        except Exception as e:
+            st.toast(f"Error processing file: {str(e)}", icon="⚠️")
+            raise e
+
+    def process_content(self, content: str, original_filename: str,
+                        progress_callback: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """Process in-memory text and store chunks in the database.
+
+        Used when the text is already available (e.g. reindexing) so it doesn't
+        have to be written to and read back from a temporary file.
+
+        Args:
+            content: Text content of the document
+            original_filename: Name used to derive the chunk ids
+            progress_callback: Called with (embedded, total) chunk counts as embedding progresses
+
+        Returns:
+            List of chunk texts that were processed
+        """
+        try:
+            if not content:
+                st.toast(f"No content found in {original_filename}.", icon="⚠️")
+                return []
 
-            # Use original filename without extension as base_id
+            texts = self.text_splitter.split_text(content)
             base_id = os.path.splitext(original_filename)[0]
+            return self._store_chunks(texts, base_id, original_filename, progress_callback)
 
-            # Process and store chunks
-            for i, chunk in enumerate(chunks):
+        except Exception as e:
+            st.toast(f"Error processing content: {str(e)}", icon="⚠️")
+            raise e
+
+    def reindex_existing_chunks(self, file_id: str, chunks: List[str], source: Optional[str] = None) -> List[str]:
+        """Re-embed and store a file's existing chunks without re-splitting them.
+
+        Args:
+            file_id: Base name shared by the file's chunk ids
+            chunks: Chunk texts in document order
+            source: Original filename recorded in the chunk metadata
+
+        Returns:
+            List of chunk texts that were processed
+        """
+        if not chunks:
+            st.toast(f"No content found for {file_id}.", icon="⚠️")
+            return []
+
+        return self._store_chunks(chunks, file_id, source or file_id, skip_unchanged=False)
+
+    def _store_chunks(self, texts: List[str], base_id: str, original_filename: str,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      skip_unchanged: bool = True) -> List[str]:
+        """Embed chunk texts and store them in the database.
+
+        Args:
+            texts: Chunk texts in document order
+            base_id: Prefix of the chunk ids (the filename without extension)
+            original_filename: Source filename recorded in the chunk metadata
+            progress_callback: Called with (embedded, total) chunk counts as embedding progresses
+            skip_unchanged: Skip chunks already stored with the same id and content
+
+        Returns:
+            List of chunk texts that were processed
+        """
+        chunk_ids = [f"{base_id}_{i}" for i in range(len(texts))]
+
+        # Re-uploading a file only embeds and writes the chunks whose text changed;
+        # unchanged chunks keep their stored embedding and sync state
+        if skip_unchanged:
+            stored = self.db.sqlite.get_file_contents(base_id)
+            changed = [i for i, (chunk_id, text) in enumerate(zip(chunk_ids, texts)) if stored.get(chunk_id) != text]
+        else:
+            changed = list(range(len(texts)))
+
+        # Embed every chunk up front so the model runs in batches
+        embeddings = self.get_embeddings([texts[i] for i in changed], progress_callback)
+
+        chunks = [{
+            'id': chunk_ids[i],
+            'content': texts[i],
+            'embedding': embedding,
+            'metadata': {"source": original_filename}
+        } for i, embedding in zip(changed, embeddings)]
+
+        # Embedding above runs concurrently; only the writes are serialized
+        with self._write_lock:
+            # Store all chunks locally in one transaction; they reach Supabase via the
+            # background sync rather than on the upload path
+            if chunks:
                 try:
-                    chunk_id = f"{base_id}_{i}"
-                    embedding = self.get_embedding(chunk.page_content)
-
-                    # Use the database manager instead of directly using Supabase
-                    self.db.store_document_chunk(
-                        chunk_id=chunk_id,
-                        content=chunk.page_content,
-                        embedding=embedding,
-                        metadata={"source": original_filename}
-                    )
-
-                    # Add nodes and edges to graph
-                    self.graph.add_node(chunk_id, content=chunk.page_content)
-                    if i > 0:
-                        self.graph.add_edge(f"{base_id}_{i-1}", chunk_id)
+                    if not self.db.sqlite.store_document_chunks(chunks):
+                        st.toast(f"Some chunks of {original_filename} could not be stored.", icon="⚠️")
                 except Exception as e:
-                    st.toast(f"Error processing chunk {i}: {str(e)}", icon="⚠️")
-                    continue
+                    st.toast(f"Error storing chunks: {str(e)}", icon="⚠️")
 
-            # Try to sync with Supabase if available, but don't show toasts for regular users
-            if self.db.supabase_available:
-                self.sync_database(show_toast=False)
+                self.clear_query_cache()
 
-            # Only show success toast for admin users
-            if hasattr(self, 'show_notifications') and self.show_notifications:
-                st.toast(f"Successfully processed {len(chunks)} chunks for {original_filename}.", icon="✅")
-            return [chunk.page_content for chunk in chunks]
+            # Record the chunk order so neighbouring chunks can be looked up
+            self._chains[base_id] = chunk_ids
 
-        except Exception as e:
-            st.toast(f"Error processing file: {str(e)}", icon="⚠️")
-            raise e
+        # Sync with Supabase in the background so uploads don't wait on the network
+        if chunks and self.db.supabase:
+            self.request_sync()
 
-    def query_similar(self, query: str, n_results: int = 5) -> List[str]:
-        """Query documents for keyword matches, with similarity search as fallback."""
+        # Only show success toast for admin users
+        if hasattr(self, 'show_notifications') and self.show_notifications:
+            st.toast(f"Successfully processed {len(texts)} chunks for {original_filename}.", icon="✅")
+        return texts
+
+    def query_similar(self, query: str, n_results: int = 5, keywords: Optional[List[str]] = None) -> List[str]:
+        """Query documents for keyword matches, with similarity search as fallback.
+
+        Args:
+            query: The user's query, embedded once for the similarity fallback
+            n_results: Maximum number of chunks to return
+            keywords: Keywords matched together in a single search; defaults to the whole query
+
+        Returns:
+            List of matching chunk texts
+        """
         try:
             # Generate embedding using FastEmbed
-            query_embedding = self.get_embedding(query)
+            query_embedding = self.get_query_embedding(query)
+
+            # Reuse results of a previous, near-identical query. The fallback
+            # embedding is not semantic, so only trust real model embeddings.
+            query_vector = None
+            search_key = (tuple(sorted(keywords or [])), n_results)
+            if self.embedding_model is not None:
+                norm = np.linalg.norm(query_embedding)
+                if norm > 0:
+                    # Not in place: the embedding itself is kept in the query embedding cache
+                    query_vector = np.asarray(query_embedding, dtype=np.float32) / norm
+                    cached = self._lookup_query_cache(query_vector, search_key)
+                    if cached is not None:
+                        return cached
 
             # Search for matches in document_chunks using the database manager
-            st.write(f"\nSearching for content containing: {query}")
-            results = self.db.query_similar(query, query_embedding, n_results)
+            results = self.db.query_similar(query, query_embedding, n_results, keywords)
 
             # Extract and return content from matches
             if results:
-                return [result['content'] for result in results]
+                contents = [result['content'] for result in results]
+                if query_vector is not None:
+                    self._semantic_cache.append((query_vector, search_key, contents))
+                return contents
 
-            st.write("No matching content found.")
             return []
 
         except Exception as e:
@@ -217,6 +583,7 @@ class SimpleDocumentProcessor:
             return False
 
         synced, total, status = self.db.sync_from_supabase()
+        self.clear_query_cache()
         if show_toast:
             st.toast(f"Import status: {status}", icon="ℹ️")
         return synced > 0
@@ -1,11 +1,76 @@
 import sqlite3
 import json
 import os
+import threading
 import numpy as np
 import streamlit as st
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 import time
 
+from .vector_index import VectorIndex, rerank
+
+# Minimum cosine similarity for a chunk to be returned by similarity search
+# (matches the match_threshold used with Supabase)
+SIMILARITY_THRESHOLD = 0.5
+
+# Candidates taken from the quantized index per result, before exact re-ranking
+RERANK_FACTOR = 4
+
+# PRAGMA user_version once JSON embeddings have been converted to float32 bytes
+EMBEDDINGS_MIGRATED_VERSION = 1
+
+# Bound parameters per IN (...) lookup, well under SQLite's variable limit
+IN_BATCH_SIZE = 500
+
+UPSERT_CHUNK_SQL = '''
+INSERT INTO document_chunks
+(id, content, embedding, metadata, last_updated, synced, file_id)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    content = excluded.content, embedding = excluded.embedding, metadata = excluded.metadata,
+    last_updated = excluded.last_updated, synced = excluded.synced, file_id = excluded.file_id
+'''
+
+def encode_embedding(embedding) -> bytes:
+    """Serialize an embedding as raw float32 bytes for a BLOB column."""
+    # Chunks imported from Supabase carry the vector as its text literal
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def decode_embedding(embedding_bytes: bytes) -> np.ndarray:
+    """Deserialize an embedding BLOB into a float32 array.
+
+    Rows written before embeddings were stored as float32 hold JSON text instead;
+    migrate_embeddings() converts them, and they are still decoded here.
+    """
+    if embedding_bytes[:1] in (b'[', b'"'):
+        try:
+            embedding = json.loads(embedding_bytes.decode())
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            return np.asarray(embedding, dtype=np.float32)
+        except ValueError:
+            pass
+    return np.frombuffer(embedding_bytes, dtype=np.float32)
+
+def file_id_of(chunk_id: str) -> Optional[str]:
+    """Return the base filename of a chunk id of the form "{base_filename}_{index}"."""
+    return chunk_id.rpartition('_')[0] or None
+
+def in_placeholders(values: List[Any]) -> Tuple[str, List[Any]]:
+    """Build the placeholders of an IN (...) clause for a list of values.
+
+    The list is padded with its last value up to a power of two, so lookups of any size
+    reuse a handful of SQL strings and stay in sqlite3's prepared statement cache.
+
+    Returns:
+        Tuple of (comma-separated placeholders, padded values)
+    """
+    size = 1 << max(len(values) - 1, 0).bit_length()
+    padded = list(values) + [values[-1]] * (size - len(values)) if values else []
+    return ','.join('?' * len(padded)), padded
+
 class SQLiteManager:
     """SQLite database manager for storing document chunks and embeddings locally."""
 
@@ -19,20 +84,56 @@ class SQLiteManager:
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        # One connection per thread, so concurrent sessions never share a transaction
+        self._local = threading.local()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+        # Embedding index for similarity search, built on first use and dropped on writes
+        self._vector_index = None
+        self._vector_index_lock = threading.Lock()
+        # Bumped by every write; a build only installs its index if no write happened
+        # since it started reading, so a slow build can't bring back deleted chunks
+        self._vector_index_generation = 0
+        self._generation_lock = threading.Lock()
+        # Whether the full-text index exists (needs SQLite 3.34+ built with FTS5)
+        self._fts_available = False
         self.connect()
         self.create_tables()
+        self.migrate_embeddings()
+
+    @property
+    def conn(self) -> Optional[sqlite3.Connection]:
+        """The calling thread's connection, opened on first use."""
+        if getattr(self._local, 'conn', None) is None:
+            self.connect()
+        return getattr(self._local, 'conn', None)
 
     def connect(self):
-        """Connect to SQLite database."""
+        """Connect to SQLite database on the calling thread."""
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # The manager is shared across Streamlit script threads via st.cache_resource.
+            # Each thread gets its own connection so one session's commit or rollback never
+            # ends another's transaction; WAL lets them read while another writes. The
+            # connection may still be closed from another thread at shutdown.
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30.0)
             # Enable foreign keys
-            self.conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA foreign_keys = ON")
+            # Write-ahead logging lets readers proceed during writes; with WAL, NORMAL
+            # sync only fsyncs at checkpoints instead of on every commit
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            # Read the database through memory-mapped I/O instead of read() calls
+            conn.execute("PRAGMA mmap_size = 268435456")
             # Configure to return rows as dictionaries
-            self.conn.row_factory = sqlite3.Row
-            self.cursor = self.conn.cursor()
+            conn.row_factory = sqlite3.Row
+
+            with self._connections_lock:
+                # Streamlit runs each script in a new thread; close connections of finished threads
+                for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+            self._local.conn = conn
             return True
         except Exception as e:
             # Use print instead of st.error to avoid UI notifications
@@ -42,20 +143,39 @@ class SQLiteManager:
     def create_tables(self):
         """Create necessary tables if they don't exist."""
         try:
+            cursor = self.conn.cursor()
             # Create document_chunks table
-            self.cursor.execute('''
+            cursor.execute('''
             CREATE TABLE IF NOT EXISTS document_chunks (
                 id TEXT PRIMARY KEY,
                 content TEXT,
-                embedding BLOB,  -- Store embedding as binary blob
+                embedding BLOB,  -- Embedding as raw float32 bytes
                 metadata TEXT,   -- Store metadata as JSON string
                 last_updated INTEGER,  -- Unix timestamp for sync purposes
-                synced INTEGER DEFAULT 0  -- 0 = not synced, 1 = synced
+                synced INTEGER DEFAULT 0,  -- 0 = not synced, 1 = synced
+                file_id TEXT     -- Base filename, the chunk id without its index suffix
             )
             ''')
 
+            # Databases created before file_id existed get the column and a backfill
+            columns = {row['name'] for row in cursor.execute('PRAGMA table_info(document_chunks)')}
+            if 'file_id' not in columns:
+                cursor.execute('ALTER TABLE document_chunks ADD COLUMN file_id TEXT')
+                cursor.execute('''
+                UPDATE document_chunks
+                SET file_id = substr(rtrim(id, '0123456789'), 1, length(rtrim(id, '0123456789')) - 1)
+                WHERE substr(rtrim(id, '0123456789'), -1) = '_'
+                ''')
+
+            # Index file_id so listing and deleting a file's chunks doesn't scan the table
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_document_chunks_file_id ON document_chunks (file_id)'
+            )
+
+            self._fts_available = self._create_fts_index(cursor)
+
             # Create sync_status table to track last sync time
-            self.cursor.execute('''
+            cursor.execute('''
             CREATE TABLE IF NOT EXISTS sync_status (
                 id INTEGER PRIMARY KEY,
                 last_sync INTEGER,  -- Unix timestamp of last sync
@@ -63,8 +183,29 @@ class SQLiteManager:
             )
             ''')
 
+            # Create response_cache table for the semantic answer cache
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT,
+                embedding BLOB,  -- Question embedding as raw float32 bytes
+                response TEXT,
+                created_at INTEGER  -- Unix timestamp used for expiry
+            )
+            ''')
+
+            # Create embedding_cache table so identical text is only embedded once per model
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                hash BLOB,       -- SHA-256 digest of the normalized embedded text
+                model TEXT,      -- Name of the embedding model
+                embedding BLOB,  -- Embedding as raw float32 bytes
+                PRIMARY KEY (hash, model)
+            )
+            ''')
+
             # Insert initial sync status if not exists
-            self.cursor.execute('''
+            cursor.execute('''
             INSERT OR IGNORE INTO sync_status (id, last_sync, status)
             VALUES (1, 0, 'Never synced')
             ''')
@@ -76,7 +217,85 @@ class SQLiteManager:
             print(f"Error creating tables: {str(e)}")
             return False
 
-    def store_document_chunk(self, chunk_id: str, content: str, embedding: list, metadata: dict) -> bool:
+    def _create_fts_index(self, cursor: sqlite3.Cursor) -> bool:
+        """Create the full-text index over chunk content and the triggers that maintain it.
+
+        The trigram tokenizer indexes every three-character sequence, so substring
+        matching keeps working for Thai text, which has no spaces between words.
+
+        Args:
+            cursor: Cursor of the transaction creating the tables
+
+        Returns:
+            bool: True if the index is available, False otherwise
+        """
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'document_chunks_fts'")
+            exists = cursor.fetchone() is not None
+
+            cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5(
+                content, content='document_chunks', content_rowid='rowid', tokenize='trigram'
+            )
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS document_chunks_fts_insert AFTER INSERT ON document_chunks BEGIN
+                INSERT INTO document_chunks_fts (rowid, content) VALUES (new.rowid, new.content);
+            END
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS document_chunks_fts_delete AFTER DELETE ON document_chunks BEGIN
+                INSERT INTO document_chunks_fts (document_chunks_fts, rowid, content)
+                VALUES ('delete', old.rowid, old.content);
+            END
+            ''')
+            cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS document_chunks_fts_update AFTER UPDATE OF content ON document_chunks BEGIN
+                INSERT INTO document_chunks_fts (document_chunks_fts, rowid, content)
+                VALUES ('delete', old.rowid, old.content);
+                INSERT INTO document_chunks_fts (rowid, content) VALUES (new.rowid, new.content);
+            END
+            ''')
+
+            # Index chunks stored before the full-text index existed
+            if not exists:
+                cursor.execute("INSERT INTO document_chunks_fts (document_chunks_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.Error as e:
+            print(f"Full-text search unavailable, using LIKE matching: {str(e)}")
+            return False
+
+    def migrate_embeddings(self) -> bool:
+        """Rewrite embeddings stored as JSON text by older versions as raw float32 bytes.
+
+        Runs once per database: afterwards PRAGMA user_version records the migration, so
+        startup skips the table scans (which would also match raw float32 blobs that
+        merely start with a '[' or '"' byte).
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            cursor = self.conn.cursor()
+            if cursor.execute("PRAGMA user_version").fetchone()[0] >= EMBEDDINGS_MIGRATED_VERSION:
+                return True
+            for table, key in (('document_chunks', 'id'), ('response_cache', 'id')):
+                # JSON embeddings start with '[', or with '"' when imported from Supabase as text
+                cursor.execute(
+                    f"SELECT {key}, embedding FROM {table} WHERE substr(embedding, 1, 1) IN (X'5B', X'22')"
+                )
+                rows = [(encode_embedding(decode_embedding(row['embedding'])), row[key]) for row in cursor.fetchall()]
+                if rows:
+                    cursor.executemany(f"UPDATE {table} SET embedding = ? WHERE {key} = ?", rows)
+            cursor.execute(f"PRAGMA user_version = {EMBEDDINGS_MIGRATED_VERSION}")
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error migrating embeddings: {str(e)}")
+            return False
+
+    def store_document_chunk(self, chunk_id: str, content: str, embedding: np.ndarray, metadata: dict) -> bool:
         """Store document chunk and its embedding in SQLite.
 
         Args:
@@ -89,12 +308,9 @@ class SQLiteManager:
             bool: True if successful, False otherwise
         """
         try:
-            # Convert numpy array to bytes for storage
-            if isinstance(embedding, np.ndarray):
-                embedding = embedding.tolist()
-
-            # Convert embedding list to bytes
-            embedding_bytes = json.dumps(embedding).encode()
+            cursor = self.conn.cursor()
+            # Convert embedding to raw float32 bytes
+            embedding_bytes = encode_embedding(embedding)
 
             # Convert metadata to JSON string
             metadata_json = json.dumps(metadata)
@@ -103,18 +319,51 @@ class SQLiteManager:
             timestamp = int(time.time())
 
             # Insert or replace document chunk
-            self.cursor.execute('''
-            INSERT OR REPLACE INTO document_chunks
-            (id, content, embedding, metadata, last_updated, synced)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ''', (chunk_id, content, embedding_bytes, metadata_json, timestamp, 0))
+            cursor.execute(
+                UPSERT_CHUNK_SQL,
+                (chunk_id, content, embedding_bytes, metadata_json, timestamp, 0, file_id_of(chunk_id))
+            )
 
             self.conn.commit()
+            self._invalidate_vector_index()
             return True
         except Exception as e:
             print(f"Error storing document chunk in SQLite: {str(e)}")
             return False
 
+    def store_document_chunks(self, chunks: List[Dict[str, Any]], synced: bool = False) -> bool:
+        """Store many document chunks in a single transaction.
+
+        Args:
+            chunks: Chunks as dictionaries with id, content, embedding and metadata
+            synced: Whether the chunks are already stored in Supabase
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            cursor = self.conn.cursor()
+            timestamp = int(time.time())
+            rows = [(
+                chunk['id'],
+                chunk['content'],
+                encode_embedding(chunk['embedding']),
+                json.dumps(chunk['metadata']),
+                timestamp,
+                int(synced),
+                file_id_of(chunk['id'])
+            ) for chunk in chunks]
+
+            cursor.executemany(UPSERT_CHUNK_SQL, rows)
+
+            self.conn.commit()
+            self._invalidate_vector_index()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error storing document chunks in SQLite: {str(e)}")
+            return False
+
     def get_document_chunks(self) -> List[Dict[str, Any]]:
         """Retrieve all document chunks from SQLite.
 
@@ -122,30 +371,80 @@ class SQLiteManager:
             List of document chunks as dictionaries
         """
         try:
-            self.cursor.execute('SELECT id, content, embedding, metadata FROM document_chunks')
-            rows = self.cursor.fetchall()
+            return [chunk for page in self.iter_document_chunks() for chunk in page]
+        except Exception as e:
+            print(f"Error retrieving document chunks from SQLite: {str(e)}")
+            return []
+
+    def iter_document_chunks(self, page_size: int = 500, unsynced_only: bool = False):
+        """Yield document chunks in pages, ordered by id.
 
-            result = []
-            for row in rows:
-                # Convert embedding bytes back to list
-                embedding_bytes = row['embedding']
-                embedding = json.loads(embedding_bytes.decode())
+        Each page is a separate query continuing after the last id of the previous one,
+        so only one page is decoded at a time and no cursor stays open between pages;
+        callers can write to the database while iterating. Errors are raised to the caller.
 
+        Args:
+            page_size: Maximum number of chunks per page
+            unsynced_only: Only yield chunks that haven't been synced with Supabase
+        """
+        condition = 'AND synced = 0' if unsynced_only else ''
+        last_id = ''
+        while True:
+            cursor = self.conn.cursor()
+            cursor.execute(f'''
+            SELECT id, content, embedding, metadata
+            FROM document_chunks
+            WHERE id > ? {condition}
+            ORDER BY id
+            LIMIT ?
+            ''', (last_id, page_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return
+
+            yield [{
+                'id': row['id'],
+                'content': row['content'],
+                # Convert embedding bytes back to an array
+                'embedding': decode_embedding(row['embedding']),
                 # Convert metadata JSON string back to dict
-                metadata_json = row['metadata']
-                metadata = json.loads(metadata_json)
+                'metadata': json.loads(row['metadata'])
+            } for row in rows]
 
-                result.append({
-                    'id': row['id'],
-                    'content': row['content'],
-                    'embedding': embedding,
-                    'metadata': metadata
-                })
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
 
-            return result
+    def get_file_ids(self) -> Set[str]:
+        """Retrieve the distinct base filenames of the stored chunks.
+
+        Returns:
+            Set of base filenames
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT DISTINCT file_id FROM document_chunks WHERE file_id IS NOT NULL')
+            return {row['file_id'] for row in cursor.fetchall()}
         except Exception as e:
-            print(f"Error retrieving document chunks from SQLite: {str(e)}")
-            return []
+            print(f"Error retrieving file ids from SQLite: {str(e)}")
+            return set()
+
+    def get_file_contents(self, file_id: str) -> Dict[str, str]:
+        """Retrieve the stored text of a file's chunks.
+
+        Args:
+            file_id: Base filename shared by the chunk ids
+
+        Returns:
+            Dictionary mapping chunk id to content
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT id, content FROM document_chunks WHERE file_id = ?', (file_id,))
+            return {row['id']: row['content'] for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error retrieving file contents from SQLite: {str(e)}")
+            return {}
 
     def delete_document_chunks(self, base_filename: str) -> bool:
         """Delete all chunks for a given file from SQLite.
@@ -157,13 +456,35 @@ class SQLiteManager:
             bool: True if successful, False otherwise
         """
         try:
-            self.cursor.execute(
-                "DELETE FROM document_chunks WHERE id LIKE ?",
-                (f'{base_filename}_%',)
+            cursor = self.conn.cursor()
+            cursor.execute("DELETE FROM document_chunks WHERE file_id = ?", (base_filename,))
+            self.conn.commit()
+            self._invalidate_vector_index()
+            return True
+        except Exception as e:
+            print(f"Error deleting document chunks from SQLite: {str(e)}")
+            return False
+
+    def delete_files(self, base_filenames: List[str]) -> bool:
+        """Delete all chunks for several files from SQLite in one transaction.
+
+        Args:
+            base_filenames: Base filenames to match for deletion
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany(
+                "DELETE FROM document_chunks WHERE file_id = ?",
+                [(base_filename,) for base_filename in base_filenames]
             )
             self.conn.commit()
+            self._invalidate_vector_index()
             return True
         except Exception as e:
+            self.conn.rollback()
             print(f"Error deleting document chunks from SQLite: {str(e)}")
             return False
 
@@ -178,13 +499,7 @@ class SQLiteManager:
             List of matching document chunks
         """
         try:
-            self.cursor.execute(
-                "SELECT content FROM document_chunks WHERE content LIKE ? LIMIT ?",
-                (f'%{keyword}%', limit)
-            )
-            rows = self.cursor.fetchall()
-
-            matches = [{'content': row['content']} for row in rows]
+            matches = self.search_keywords([keyword], limit)
             if matches:
                 st.write(f"Found {len(matches)} chunks containing '{keyword}'")
 
@@ -193,36 +508,142 @@ class SQLiteManager:
             print(f"Error in SQLite keyword search: {str(e)}")
             return []
 
-    def query_similar(self, query: str, query_embedding: list, n_results: int = 10) -> List[Dict[str, Any]]:
-        """Query documents using keyword matching in SQLite.
+    def search_keywords(self, keywords: List[str], limit: int = 10) -> List[Dict[str, Any]]:
+        """Search for chunks containing any of several keywords in one query.
 
-        Note: This is a simplified version that doesn't do true vector similarity search,
-        as SQLite doesn't have built-in vector operations. For a production app, consider
-        using an extension like sqlite-vss or a more sophisticated approach.
+        Args:
+            keywords: Keywords to search for
+            limit: Maximum number of results to return
+
+        Returns:
+            List of matching document chunks
+        """
+        if not keywords:
+            return []
+        try:
+            cursor = self.conn.cursor()
+            matches = []
+
+            # Trigrams can only match keywords of three or more characters; those are
+            # looked up in the full-text index, best BM25 matches first
+            indexed = [keyword for keyword in keywords if len(keyword) >= 3] if self._fts_available else []
+            if indexed:
+                cursor.execute(
+                    "SELECT content FROM document_chunks_fts WHERE document_chunks_fts MATCH ? ORDER BY rank LIMIT ?",
+                    (" OR ".join('"' + keyword.replace('"', '""') + '"' for keyword in indexed), limit)
+                )
+                matches = [{'content': row['content']} for row in cursor.fetchall()]
+
+            # Shorter keywords fall back to scanning with LIKE
+            others = [keyword for keyword in keywords if keyword not in indexed]
+            if others and len(matches) < limit:
+                found = {match['content'] for match in matches}
+                conditions = " OR ".join(["content LIKE ?"] * len(others))
+                cursor.execute(
+                    f"SELECT content FROM document_chunks WHERE {conditions} LIMIT ?",
+                    [f'%{keyword}%' for keyword in others] + [limit]
+                )
+                for row in cursor.fetchall():
+                    if len(matches) >= limit:
+                        break
+                    if row['content'] not in found:
+                        matches.append({'content': row['content']})
+                        found.add(row['content'])
+
+            return matches
+        except Exception as e:
+            print(f"Error in SQLite keyword search: {str(e)}")
+            return []
+
+    def _invalidate_vector_index(self):
+        """Drop the embedding index after a committed write to the chunks."""
+        with self._generation_lock:
+            self._vector_index_generation += 1
+            self._vector_index = None
+
+    def _get_vector_index(self) -> VectorIndex:
+        """Return the embedding index, building it from the stored chunks if needed."""
+        with self._vector_index_lock:
+            index = self._vector_index
+            if index is None:
+                generation = self._vector_index_generation
+                cursor = self.conn.cursor()
+                ids, embeddings = [], []
+                # Stream the rows; only the decoded vectors are kept
+                for row in cursor.execute('SELECT id, embedding FROM document_chunks'):
+                    embedding = decode_embedding(row['embedding'])
+                    # Skip vectors from a different model so the matrix stays rectangular
+                    if embeddings and len(embedding) != len(embeddings[0]):
+                        continue
+                    ids.append(row['id'])
+                    embeddings.append(embedding)
+                index = VectorIndex(ids, np.vstack(embeddings) if embeddings else [])
+                with self._generation_lock:
+                    if generation == self._vector_index_generation:
+                        self._vector_index = index
+            return index
+
+    def search_similar(self, query_embedding: np.ndarray, limit: int = 10,
+                       threshold: float = SIMILARITY_THRESHOLD) -> List[Dict[str, Any]]:
+        """Find the chunks whose embeddings are most similar to the query embedding.
+
+        Args:
+            query_embedding: Vector embedding of the query
+            limit: Maximum number of results to return
+            threshold: Minimum cosine similarity for a result
+
+        Returns:
+            List of matching document chunks with their similarity, most similar first
+        """
+        try:
+            # Shortlist candidates from the quantized index, then rank them exactly
+            hits = self._get_vector_index().search(query_embedding, limit * RERANK_FACTOR)
+            if not hits:
+                return []
+
+            cursor = self.conn.cursor()
+            placeholders, ids = in_placeholders([chunk_id for chunk_id, _ in hits])
+            cursor.execute(f"SELECT id, content, embedding FROM document_chunks WHERE id IN ({placeholders})", ids)
+            rows = {row['id']: row for row in cursor.fetchall()}
+            candidates = [
+                (chunk_id, decode_embedding(rows[chunk_id]['embedding']))
+                for chunk_id, _ in hits if chunk_id in rows
+            ]
+
+            return [
+                {'id': chunk_id, 'content': rows[chunk_id]['content'], 'similarity': similarity}
+                for chunk_id, similarity in rerank(query_embedding, candidates, limit, threshold)
+            ]
+        except Exception as e:
+            print(f"Error in SQLite similarity search: {str(e)}")
+            return []
+
+    def query_similar(self, query: str, query_embedding: np.ndarray, n_results: int = 10,
+                      keywords: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Query documents using keyword matching in SQLite, with similarity search as fallback.
 
         Args:
             query: Query text
             query_embedding: Vector embedding of the query
             n_results: Maximum number of results to return
+            keywords: Keywords to match instead of the whole query
 
         Returns:
             List of matching document chunks
         """
         try:
             # First try keyword search
-            matches = self.search_keyword(query, n_results)
-
-            # If no keyword matches and we have less than n_results,
-            # fall back to returning the most recent chunks
-            if not matches or len(matches) < n_results:
-                remaining = n_results - len(matches)
-                self.cursor.execute(
-                    "SELECT content FROM document_chunks ORDER BY last_updated DESC LIMIT ?",
-                    (remaining,)
-                )
-                rows = self.cursor.fetchall()
-                additional_matches = [{'content': row['content']} for row in rows]
-                matches.extend(additional_matches)
+            matches = self.search_keywords(keywords or [query], n_results)
+
+            # Fill any remaining slots with the most similar chunks by embedding
+            if len(matches) < n_results:
+                found = {match['content'] for match in matches}
+                for match in self.search_similar(query_embedding, n_results):
+                    if len(matches) >= n_results:
+                        break
+                    if match['content'] not in found:
+                        matches.append({'content': match['content']})
+                        found.add(match['content'])
 
             return matches
         except Exception as e:
@@ -239,7 +660,8 @@ class SQLiteManager:
             bool: True if successful, False otherwise
         """
         try:
-            self.cursor.execute(
+            cursor = self.conn.cursor()
+            cursor.execute(
                 "UPDATE document_chunks SET synced = 1 WHERE id = ?",
                 (chunk_id,)
             )
@@ -249,6 +671,31 @@ class SQLiteManager:
             print(f"Error marking chunk as synced: {str(e)}")
             return False
 
+    def mark_chunks_synced(self, chunks: List[Dict[str, Any]]) -> bool:
+        """Mark several document chunks as synced with Supabase in one transaction.
+
+        A chunk rewritten since it was sent keeps synced = 0, so its new content is
+        sent by the next sync instead of being flagged as already there.
+
+        Args:
+            chunks: The chunks as sent to Supabase, with id and content
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany(
+                "UPDATE document_chunks SET synced = 1 WHERE id = ? AND content = ?",
+                [(chunk['id'], chunk['content']) for chunk in chunks]
+            )
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error marking chunks as synced: {str(e)}")
+            return False
+
     def get_unsynced_chunks(self) -> List[Dict[str, Any]]:
         """Get all document chunks that haven't been synced with Supabase.
 
@@ -256,31 +703,7 @@ class SQLiteManager:
             List of unsynced document chunks
         """
         try:
-            self.cursor.execute('''
-            SELECT id, content, embedding, metadata
-            FROM document_chunks
-            WHERE synced = 0
-            ''')
-            rows = self.cursor.fetchall()
-
-            result = []
-            for row in rows:
-                # Convert embedding bytes back to list
-                embedding_bytes = row['embedding']
-                embedding = json.loads(embedding_bytes.decode())
-
-                # Convert metadata JSON string back to dict
-                metadata_json = row['metadata']
-                metadata = json.loads(metadata_json)
-
-                result.append({
-                    'id': row['id'],
-                    'content': row['content'],
-                    'embedding': embedding,
-                    'metadata': metadata
-                })
-
-            return result
+            return [chunk for page in self.iter_document_chunks(unsynced_only=True) for chunk in page]
         except Exception as e:
             print(f"Error retrieving unsynced chunks: {str(e)}")
             return []
@@ -296,7 +719,8 @@ class SQLiteManager:
             bool: True if successful, False otherwise
         """
         try:
-            self.cursor.execute('''
+            cursor = self.conn.cursor()
+            cursor.execute('''
             UPDATE sync_status
             SET last_sync = ?, status = ?
             WHERE id = 1
@@ -314,8 +738,9 @@ class SQLiteManager:
             Dictionary with last_sync timestamp and status message
         """
         try:
-            self.cursor.execute('SELECT last_sync, status FROM sync_status WHERE id = 1')
-            row = self.cursor.fetchone()
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT last_sync, status FROM sync_status WHERE id = 1')
+            row = cursor.fetchone()
 
             if row:
                 return {
@@ -334,7 +759,128 @@ class SQLiteManager:
                 'status': f'Error: {str(e)}'
             }
 
+    def store_cached_response(self, question: str, embedding: list, response: str) -> bool:
+        """Store an answer in the response cache.
+
+        Args:
+            question: Question that was answered
+            embedding: Vector embedding of the question
+            response: Generated answer
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+            INSERT INTO response_cache (question, embedding, response, created_at)
+            VALUES (?, ?, ?, ?)
+            ''', (question, encode_embedding(embedding), response, int(time.time())))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error storing cached response: {str(e)}")
+            return False
+
+    def get_cached_responses(self, since: int) -> List[Dict[str, Any]]:
+        """Get cached answers created after a given time, dropping older ones.
+
+        Args:
+            since: Unix timestamp; entries created before this are expired
+
+        Returns:
+            List of cached responses, oldest first
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('DELETE FROM response_cache WHERE created_at < ?', (since,))
+            self.conn.commit()
+
+            cursor.execute('''
+            SELECT question, embedding, response, created_at
+            FROM response_cache
+            ORDER BY created_at
+            ''')
+            rows = cursor.fetchall()
+
+            return [{
+                'question': row['question'],
+                'embedding': decode_embedding(row['embedding']),
+                'response': row['response'],
+                'created_at': row['created_at']
+            } for row in rows]
+        except Exception as e:
+            print(f"Error retrieving cached responses: {str(e)}")
+            return []
+
+    def clear_response_cache(self) -> bool:
+        """Remove all cached answers.
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('DELETE FROM response_cache')
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error clearing response cache: {str(e)}")
+            return False
+
+    def get_cached_embeddings(self, hashes: List[bytes], model: str) -> Dict[bytes, np.ndarray]:
+        """Look up cached embeddings by text hash.
+
+        Args:
+            hashes: SHA-256 digests of the texts
+            model: Name of the embedding model
+
+        Returns:
+            Dictionary mapping each cached hash to its embedding
+        """
+        try:
+            cursor = self.conn.cursor()
+            hashes = list(dict.fromkeys(hashes))
+            result = {}
+            for start in range(0, len(hashes), IN_BATCH_SIZE):
+                placeholders, batch = in_placeholders(hashes[start:start + IN_BATCH_SIZE])
+                cursor.execute(
+                    f"SELECT hash, embedding FROM embedding_cache WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch]
+                )
+                result.update((row['hash'], decode_embedding(row['embedding'])) for row in cursor.fetchall())
+            return result
+        except Exception as e:
+            print(f"Error retrieving cached embeddings: {str(e)}")
+            return {}
+
+    def store_cached_embeddings(self, embeddings: Dict[bytes, Any], model: str) -> bool:
+        """Store embeddings in the cache in one transaction.
+
+        Args:
+            embeddings: Dictionary mapping text hash to embedding
+            model: Name of the embedding model
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.executemany(
+                'INSERT OR REPLACE INTO embedding_cache (hash, model, embedding) VALUES (?, ?, ?)',
+                [(text_hash, model, encode_embedding(embedding)) for text_hash, embedding in embeddings.items()]
+            )
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error storing cached embeddings: {str(e)}")
+            return False
+
     def close(self):
-        """Close the database connection."""
-        if self.conn:
-            self.conn.close()
+        """Close the database connections of every thread."""
+        with self._connections_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -1,8 +1,24 @@
 from supabase import create_client
+from supabase.lib.client_options import ClientOptions
+import httpx
 import streamlit as st
 import numpy as np
 import json
 
+# Rows sent per upsert request when storing chunks in bulk
+UPSERT_BATCH_SIZE = 500
+# Rows fetched per request when reading whole tables; PostgREST caps responses at
+# 1000 rows by default, so larger reads must be paged
+PAGE_SIZE = 1000
+
+def to_halfvec_literal(embedding) -> str:
+    """Format an embedding as a half-precision pgvector literal.
+
+    The shortest float16 representation of each value is about a third the size of
+    the JSON float list, and matches the precision of the halfvec column.
+    """
+    return '[' + ','.join(map(str, np.asarray(embedding, dtype=np.float16))) + ']'
+
 class SupabaseManager:
     def __init__(self):
         if "SUPABASE_URL" not in st.secrets or "SUPABASE_KEY" not in st.secrets:
@@ -11,19 +27,30 @@ class SupabaseManager:
             
         self.supabase_url = st.secrets["SUPABASE_URL"]
         self.supabase_key = st.secrets["SUPABASE_KEY"]
-        self.supabase = create_client(self.supabase_url, self.supabase_key)
+        # One pooled HTTP/2 client for every PostgREST call, so requests reuse a warm
+        # connection instead of paying a TCP + TLS handshake each time. Failed connection
+        # attempts are retried by the transport before an error reaches the caller.
+        self.http_client = httpx.Client(
+            transport=httpx.HTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_keepalive_connections=8, max_connections=16, keepalive_expiry=60.0)
+            ),
+            timeout=httpx.Timeout(60.0, connect=2.0)
+        )
+        self.supabase = create_client(
+            self.supabase_url,
+            self.supabase_key,
+            options=ClientOptions(httpx_client=self.http_client)
+        )
 
     def store_document_chunk(self, chunk_id: str, content: str, embedding: list, metadata: dict):
         """Store document chunk and its embedding"""
         try:
-            # Convert numpy array to list if necessary
-            if isinstance(embedding, np.ndarray):
-                embedding = embedding.tolist()
-                
             data = {
                 'id': chunk_id,
                 'content': content,
-                'embedding': embedding,  # Store directly as list
+                'embedding': to_halfvec_literal(embedding),
                 'metadata': json.dumps(metadata)
             }
             self.supabase.table('document_chunks').upsert(data).execute()
@@ -33,21 +60,76 @@ class SupabaseManager:
             st.error(f"Full error details: {str(e)}")  
             return False
 
+    def store_document_chunks(self, chunks: list):
+        """Store many document chunks, upserting them in batches of UPSERT_BATCH_SIZE rows"""
+        try:
+            rows = [{
+                'id': chunk['id'],
+                'content': chunk['content'],
+                'embedding': to_halfvec_literal(chunk['embedding']),
+                'metadata': json.dumps(chunk['metadata'])
+            } for chunk in chunks]
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                self.supabase.table('document_chunks').upsert(rows[start:start + UPSERT_BATCH_SIZE]).execute()
+            return True
+        except Exception as e:
+            st.error(f"Error storing document chunks: {str(e)}")
+            return False
+
+    def iter_document_chunks(self, columns: str = 'id, content, embedding, metadata'):
+        """Yield every document chunk in pages of PAGE_SIZE rows, ordered by id.
+
+        Only one page is held at a time. Errors are raised to the caller.
+        """
+        offset = 0
+        while True:
+            response = self.supabase.table('document_chunks')\
+                .select(columns)\
+                .order('id')\
+                .range(offset, offset + PAGE_SIZE - 1)\
+                .execute()
+            rows = response.data or []
+            if rows:
+                yield rows
+            if len(rows) < PAGE_SIZE:
+                return
+            offset += PAGE_SIZE
+
     def get_document_chunks(self):
         """Retrieve all document chunks"""
         try:
-            response = self.supabase.table('document_chunks').select('*').execute()
-            return response.data
+            return [row for page in self.iter_document_chunks() for row in page]
         except Exception as e:
             st.error(f"Error retrieving document chunks: {str(e)}")
             return []
 
+    def get_file_ids(self):
+        """Retrieve the distinct file ids, reading only the file_id column"""
+        try:
+            return {row['file_id'] for page in self.iter_document_chunks('file_id') for row in page
+                    if row['file_id']}
+        except Exception as e:
+            st.error(f"Error retrieving file ids: {str(e)}")
+            return set()
+
     def delete_document_chunks(self, base_filename: str):
         """Delete all chunks for a given file"""
         try:
             self.supabase.table('document_chunks')\
                 .delete()\
-                .like('id', f'{base_filename}_%')\
+                .eq('file_id', base_filename)\
+                .execute()
+            return True
+        except Exception as e:
+            st.error(f"Error deleting document chunks: {str(e)}")
+            return False
+
+    def delete_files(self, base_filenames: list):
+        """Delete all chunks for several files in a single request"""
+        try:
+            self.supabase.table('document_chunks')\
+                .delete()\
+                .in_('file_id', list(base_filenames))\
                 .execute()
             return True
         except Exception as e:
@@ -73,18 +155,39 @@ class SupabaseManager:
             st.error(f"Error in keyword search: {str(e)}")
             return []
 
-    def query_similar(self, query: str, query_embedding: list, n_results: int = 10):
+    def search_keywords(self, keywords: list, limit: int = 10):
+        """Search for chunks containing any of several keywords in one request"""
+        if not keywords:
+            return []
+        try:
+            # Quote each pattern so commas or parentheses in a keyword can't break the filter
+            conditions = ','.join(
+                'content.ilike."*{}*"'.format(keyword.replace('\\', '\\\\').replace('"', '\\"'))
+                for keyword in keywords
+            )
+            response = self.supabase.table('document_chunks')\
+                .select('content')\
+                .or_(conditions)\
+                .limit(limit)\
+                .execute()
+
+            return response.data if response.data else []
+        except Exception as e:
+            st.error(f"Error in keyword search: {str(e)}")
+            return []
+
+    def query_similar(self, query: str, query_embedding: list, n_results: int = 10, keywords: list = None):
         """Query documents using keyword matching"""
         try:
             # First try keyword search
-            matches = self.search_keyword(query, n_results)
+            matches = self.search_keywords(keywords or [query], n_results)
             
             # If no keyword matches, try similarity search
             if not matches:
                 similarity_response = self.supabase.rpc(
                     'match_documents_similarity_v1',
                     {
-                        'query_embedding': query_embedding,
+                        'query_embedding': to_halfvec_literal(query_embedding),
                         'match_threshold': 0.5,
                         'match_count': n_results
                     }
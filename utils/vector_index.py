@@ -0,0 +1,105 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Rows converted back to float32 at a time while scanning the int8 codes
+SCAN_BLOCK_SIZE = 4096
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a matrix, leaving zero rows as they are."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class VectorIndex:
+    """Cosine-similarity index over document chunk embeddings.
+
+    The embeddings are L2-normalized and scalar-quantized to int8 with one scale per
+    row, a quarter of the memory of float32 vectors. Scores computed from the codes are
+    approximate, so callers wanting exact ordering should fetch a few more candidates
+    than they need and pass them through rerank().
+    """
+
+    def __init__(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Build the index.
+
+        Args:
+            ids: Chunk ids, in the same order as the embeddings
+            embeddings: One embedding per chunk
+        """
+        self.ids = list(ids)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        # An empty table gives no vectors to infer the dimension from
+        matrix = _normalize(matrix.reshape(len(self.ids), -1) if self.ids else matrix.reshape(0, 0))
+        self.dim = matrix.shape[1]
+
+        scales = np.abs(matrix).max(axis=1, initial=0.0) / 127.0
+        scales[scales == 0] = 1.0
+        self.codes = np.round(matrix / scales[:, None]).astype(np.int8)
+        self.scales = scales.astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query_embedding: Sequence[float], k: int, threshold: float = -1.0) -> List[Tuple[str, float]]:
+        """Find the chunks most similar to a query embedding.
+
+        Args:
+            query_embedding: Embedding of the query
+            k: Maximum number of results to return
+            threshold: Minimum approximate cosine similarity for a result
+
+        Returns:
+            List of (chunk id, approximate similarity) pairs, most similar first
+        """
+        if not self.ids or k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[0] != self.dim or not query.any():
+            return []
+        query = _normalize(query)
+
+        # Widen the codes into one reused block buffer and write the products straight
+        # into the score array, so the scan allocates nothing per block
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        buffer = np.empty((min(SCAN_BLOCK_SIZE, len(self.ids)), self.dim), dtype=np.float32)
+        for start in range(0, len(self.ids), SCAN_BLOCK_SIZE):
+            block = self.codes[start:start + SCAN_BLOCK_SIZE]
+            widened = buffer[:len(block)]
+            np.copyto(widened, block, casting='unsafe')
+            np.matmul(widened, query, out=scores[start:start + len(block)])
+        scores *= self.scales
+
+        # Partial sort: only the top k scores are ordered
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] >= threshold]
+
+def rerank(query_embedding: Sequence[float], candidates: Sequence[Tuple[str, Sequence[float]]],
+           k: int, threshold: float = -1.0) -> List[Tuple[str, float]]:
+    """Re-score candidates with exact cosine similarity on their full-precision embeddings.
+
+    Args:
+        query_embedding: Embedding of the query
+        candidates: (chunk id, embedding) pairs, e.g. the ids returned by VectorIndex.search
+        k: Maximum number of results to return
+        threshold: Minimum cosine similarity for a result
+
+    Returns:
+        List of (chunk id, similarity) pairs, most similar first
+    """
+    if not candidates or k <= 0:
+        return []
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    if not query.any():
+        return []
+    matrix = np.asarray([embedding for _, embedding in candidates], dtype=np.float32)
+    if matrix.ndim != 2 or matrix.shape[1] != query.shape[0]:
+        return []
+
+    scores = _normalize(matrix) @ _normalize(query)
+    order = np.argsort(-scores)[:k]
+    return [(candidates[i][0], float(scores[i])) for i in order if scores[i] >= threshold]